@@ -0,0 +1,77 @@
+"""
+Memory of a wide export block in the compact form built by ``scils_utils``
+(int32 spot ids, narrow coordinates, dictionary-encoded tissue_id and
+optionally float32 intensities) against plain int64/object/float64 columns.
+Run it from the repository root:
+
+    python -m benchmarks.bench_blocks --spots 100000 --features 200
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_session import SyntheticConfig, SyntheticSession
+from scils_utils import (
+    BASE_COLUMNS,
+    Region,
+    build_feature_block,
+    build_region_frame,
+    load_region_spots,
+)
+
+
+def plain_frame(region: Region, spots, feature_block: np.ndarray, all_columns: list[str]) -> pd.DataFrame:
+    """
+    The block with int64 spot ids and coordinates, one string object per
+    row for tissue_id and float64 intensities.
+    """
+    spot_ids, x, y = (np.asarray(values, dtype=np.int64) for values in spots)
+    region_data = {
+        "spotId": spot_ids,
+        "x": x,
+        "y": y,
+        "tissue_id": [region.name.split("/")[-1]] * len(spot_ids),
+    }
+    for j, feature_name in enumerate(all_columns[len(BASE_COLUMNS):]):
+        region_data[feature_name] = feature_block[:, j].astype(np.float64)
+    return pd.DataFrame(region_data, columns=all_columns)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the memory of plain and compact export blocks.")
+    parser.add_argument("--spots", type=int, default=100_000)
+    parser.add_argument("--features", type=int, default=200)
+    parser.add_argument("--sparsity", type=float, default=0.3)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = SyntheticConfig(regions=1, spots_per_region=args.spots, features=args.features, sparsity=args.sparsity)
+    with SyntheticSession(config) as session:
+        dataset = session.dataset_proxy
+        feature_table = dataset.feature_table
+        region_node = dataset.get_region_tree().subregions[0]
+        region = Region(name=region_node.name, id=region_node.id)
+        features = feature_table.get_features(feature_table.get_feature_lists()["id"][0])
+        spots = load_region_spots(dataset, region)
+        feature_intensities = [
+            feature_table.get_feature_intensities(feature_id, region.id) for feature_id in features["id"]
+        ]
+    all_columns = BASE_COLUMNS + list(features["name"])
+
+    feature_block = build_feature_block(spots[0], feature_intensities)
+    plain = plain_frame(region, spots, feature_block, all_columns)
+    reference = plain.memory_usage(deep=True).sum()
+    print(f"{'plain':<20} {reference / 1024**2:10.1f} MB")
+    for dtype in ("float64", "float32"):
+        block = build_feature_block(spots[0], feature_intensities, dtype)
+        frame = build_region_frame(region, *spots, block, all_columns)
+        size = frame.memory_usage(deep=True).sum()
+        print(f"{f'compact {dtype}':<20} {size / 1024**2:10.1f} MB {size / reference:6.1%}")
+        base = frame[BASE_COLUMNS].memory_usage(deep=True).sum()
+        plain_base = plain[BASE_COLUMNS].memory_usage(deep=True).sum()
+        print(f"{'  spot columns':<20} {base / 1024**2:10.1f} MB {base / plain_base:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
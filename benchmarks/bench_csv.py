@@ -0,0 +1,72 @@
+"""
+Compare ``DataFrame.to_csv`` with the ``CsvWriter`` formatter on the same
+wide export block. Run it from the repository root:
+
+    python -m benchmarks.bench_csv --rows 100000 --features 200 --workers 1 4
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from export_writers import CsvWriter
+from scils_utils import BASE_COLUMNS, Region, build_region_frame
+
+
+def make_block(rows: int, features: int, sparsity: float, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    feature_block = rng.random((rows, features)) * 1000.0
+    feature_block[rng.random((rows, features)) < sparsity] = np.nan
+    spot_ids = np.arange(rows)
+    columns = BASE_COLUMNS + [f"m/z {400 + 0.5 * i:.4f}" for i in range(features)]
+    return build_region_frame(
+        Region(name="Regions/Region 0", id="region_0"),
+        spot_ids, spot_ids % 1000, spot_ids // 1000, feature_block, columns,
+    )
+
+
+def time_to_csv(block: pd.DataFrame, path: str) -> float:
+    start = time.perf_counter()
+    with open(path, "w", newline="") as f:
+        pd.DataFrame(columns=block.columns).to_csv(f, index=False)
+        block.to_csv(f, header=False, index=False)
+    return time.perf_counter() - start
+
+
+def time_writer(block: pd.DataFrame, path: str, workers: int) -> float:
+    start = time.perf_counter()
+    with CsvWriter(path, list(block.columns), format_workers=workers) as writer:
+        writer.write_block(block)
+    return time.perf_counter() - start
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CSV formatting of an export block.")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--features", type=int, default=100)
+    parser.add_argument("--sparsity", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Format worker counts to compare")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    block = make_block(args.rows, args.features, args.sparsity)
+    with tempfile.TemporaryDirectory() as output_dir:
+        reference_path = os.path.join(output_dir, "to_csv.csv")
+        reference = time_to_csv(block, reference_path)
+        print(f"{'to_csv':<20} {reference:8.3f}s")
+        for workers in args.workers:
+            path = os.path.join(output_dir, f"writer_{workers}.csv")
+            seconds = time_writer(block, path, workers)
+            identical = filecmp.cmp(reference_path, path, shallow=False)
+            print(
+                f"{f'CsvWriter x{workers}':<20} {seconds:8.3f}s {reference / seconds:6.2f}x "
+                f"{'identical' if identical else 'DIFFERENT'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+End-to-end benchmark of ``generate_csv`` on synthetic datasets.
+
+Runs the export on a grid of dataset sizes with ``SyntheticSession`` standing
+in for SCiLS, records wall time and peak memory and compares them with the
+stored baseline. Run it from the repository root:
+
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --update-baseline
+
+The exit code is 1 when a case is slower or uses more memory than the
+baseline allows. Timings depend on the machine, regenerate the baseline when
+moving to another one.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+
+from benchmarks.synthetic_session import SyntheticConfig, SyntheticSession
+from scils_utils import generate_csv, get_feature_lists, get_region_list
+from session_manager import session_manager
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+GRID = [
+    SyntheticConfig(regions=4, spots_per_region=5_000, features=20),
+    SyntheticConfig(regions=8, spots_per_region=5_000, features=50),
+    SyntheticConfig(regions=16, spots_per_region=2_000, features=200, sparsity=0.7),
+]
+
+
+def case_name(config: SyntheticConfig) -> str:
+    return (
+        f"r{config.regions}_s{config.spots_per_region}_"
+        f"f{config.features}_sp{config.sparsity:g}"
+    )
+
+
+def _export(config: SyntheticConfig, output_path: str, **export_kwargs):
+    slx_filepath = f"{case_name(config)}.slx"
+    session_manager.session_factory = lambda file_path: SyntheticSession(config)
+    try:
+        with session_manager.session(slx_filepath) as session:
+            feature_list = get_feature_lists(session, slx_filepath)[0]
+            regions = get_region_list(session, slx_filepath)
+        return generate_csv(
+            slx_filepath,
+            output_path,
+            regions,
+            feature_list,
+            log=lambda message: None,
+            **export_kwargs,
+        )
+    finally:
+        session_manager.close_all()
+
+
+def run_case(config: SyntheticConfig, output_dir: str, repeat: int = 3, output_format: str = "csv") -> dict:
+    """
+    Export ``config`` ``repeat`` times and return the best wall time, plus the
+    peak traced memory of one extra run under ``tracemalloc``.
+    """
+    output_path = os.path.join(output_dir, f"{case_name(config)}.{output_format}")
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        summary = _export(config, output_path)
+        seconds.append(time.perf_counter() - start)
+
+    # Tracing slows the export down, so memory is measured in a separate run
+    tracemalloc.start()
+    try:
+        _export(config, output_path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "config": asdict(config),
+        "seconds": min(seconds),
+        "peak_mb": peak / 1024**2,
+        "rows": summary.rows,
+        "bytes": os.path.getsize(output_path),
+        "stages": {name: stage["seconds"] for name, stage in summary.stats["stages"].items()},
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list[str]:
+    """
+    Return a message for every case that regressed against ``baseline``.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result["seconds"] > reference["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {result['seconds']:.3f}s vs baseline {reference['seconds']:.3f}s"
+            )
+        if result["peak_mb"] > reference["peak_mb"] * (1 + memory_tolerance):
+            regressions.append(
+                f"{name}: {result['peak_mb']:.1f} MB vs baseline {reference['peak_mb']:.1f} MB"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generate_csv on synthetic datasets.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case, the best one is kept")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.1, help="Allowed relative memory growth")
+    parser.add_argument("--format", default="csv", help="Output format of the exports")
+    parser.add_argument("--quick", action="store_true", help="Only run the smallest case")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    grid = GRID[:1] if args.quick else GRID
+
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for config in grid:
+            name = case_name(config)
+            results[name] = run_case(config, output_dir, args.repeat, args.format)
+            result = results[name]
+            print(
+                f"{name:<28} {result['seconds']:8.3f}s {result['peak_mb']:9.1f} MB "
+                f"{result['rows']:>9} rows {result['bytes'] / 1024**2:9.1f} MB written"
+            )
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
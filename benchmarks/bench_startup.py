@@ -0,0 +1,165 @@
+"""
+Cold start benchmark of the GUI, SCiLS Lab is not needed.
+
+Starts a fresh interpreter per run that imports ``feature_extractor_gui``,
+builds the main window and shows it (on Qt's offscreen platform), and
+records the time until the window is shown. The modules that are loaded by
+then are checked against ``HEAVY_MODULES``, which must only be imported on
+first use or by the background preload. Run it from the repository root:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --update-baseline
+    python -m benchmarks.bench_startup --report
+
+``--report`` prints the slowest imports of the start as measured by
+``python -X importtime``. The exit code is 1 when a heavy module is loaded
+before the window is shown or the start is slower than the baseline allows.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded before the window is shown
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "scilslab", "scils_utils")
+
+# Run in the child interpreter, prints the timings and loaded modules as JSON
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import feature_extractor_gui
+imported = time.perf_counter()
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = feature_extractor_gui.MainWindow()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "show_seconds": shown - start,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def _environment() -> dict:
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def run_startup() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", _STARTUP_SCRIPT],
+        cwd=REPOSITORY,
+        env=_environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # The window logs to stdout as well, the result is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat: int) -> dict:
+    runs = [run_startup() for _ in range(repeat)]
+    loaded = sorted({
+        module.split(".")[0]
+        for run in runs
+        for module in run["modules"]
+        if module.split(".")[0] in HEAVY_MODULES
+    })
+    return {
+        "import_seconds": statistics.median(run["import_seconds"] for run in runs),
+        "show_seconds": statistics.median(run["show_seconds"] for run in runs),
+        "heavy_modules": loaded,
+    }
+
+
+def import_report(top: int) -> list[tuple[int, int, str]]:
+    """
+    Return the ``top`` imports of ``feature_extractor_gui`` with the largest
+    cumulative time as (self us, cumulative us, module) tuples.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import feature_extractor_gui"],
+        cwd=REPOSITORY,
+        env=_environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = [field.strip() for field in line[len("import time:"):].split("|")]
+        if not fields[0].isdigit():
+            # Column header
+            continue
+        entries.append((int(fields[0]), int(fields[1]), fields[2]))
+    return sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the GUI.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the result as the new baseline")
+    parser.add_argument("--repeat", type=int, default=5, help="Starts measured, the median is kept")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed slowdown against the baseline")
+    parser.add_argument("--report", action="store_true", help="Print the slowest imports of the start")
+    parser.add_argument("--top", type=int, default=25, help="Imports listed by --report")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if args.report:
+        print(f"{'self [ms]':>10} {'cumulative [ms]':>16}  module")
+        for self_us, cumulative_us, module in import_report(args.top):
+            print(f"{self_us / 1000:10.1f} {cumulative_us / 1000:16.1f}  {module}")
+        print()
+
+    result = measure(args.repeat)
+    print(
+        f"import {result['import_seconds']:.3f}s, window shown after {result['show_seconds']:.3f}s"
+    )
+
+    regressions = []
+    if result["heavy_modules"]:
+        regressions.append(f"loaded before the window is shown: {', '.join(result['heavy_modules'])}")
+
+    if args.update_baseline:
+        if regressions:
+            print(f"REGRESSION {regressions[0]}")
+            return 1
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        baseline = None
+    if baseline is not None and result["show_seconds"] > baseline["show_seconds"] * (1 + args.tolerance):
+        regressions.append(
+            f"window shown after {result['show_seconds']:.3f}s vs baseline {baseline['show_seconds']:.3f}s"
+        )
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+In-memory stand-in for ``scilslab.LocalSession``.
+
+Implements the parts of the SCiLS API used by the exporter (region tree,
+region spots, feature lists and feature intensities) on generated data, so
+the export pipeline can be benchmarked without SCiLS Lab installed.
+"""
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from scils_utils import FeatureIntensities
+
+ROOT_REGION_ID = "regions"
+FEATURE_LIST_ID = "synthetic"
+
+
+@dataclass
+class SyntheticConfig:
+    regions: int = 4
+    spots_per_region: int = 10_000
+    features: int = 50
+    # Share of the spots of a region without a value for a feature
+    sparsity: float = 0.3
+    seed: int = 0
+
+
+class _RegionNode:
+    def __init__(self, id: str, name: str, subregions=()):
+        self.id = id
+        self.name = name
+        self.subregions = list(subregions)
+
+
+class SyntheticFeatureTable:
+    def __init__(self, dataset: "SyntheticDataset"):
+        self._dataset = dataset
+        config = dataset.config
+        self._feature_ids = [f"feature_{i}" for i in range(config.features)]
+        self._features = pd.DataFrame({
+            "id": self._feature_ids,
+            "name": [f"m/z {400 + 0.5 * i:.4f}" for i in range(config.features)],
+        })
+
+    def get_feature_lists(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "name": ["Synthetic features"],
+            "id": [FEATURE_LIST_ID],
+            "num_features": [len(self._feature_ids)],
+        })
+
+    def get_features(self, feature_list_id: str) -> pd.DataFrame:
+        return self._features.copy()
+
+    def get_feature_intensities(self, feature_id: str, region_id: str) -> FeatureIntensities:
+        spot_ids = self._dataset.region_spot_ids(region_id)
+        feature_index = self._feature_ids.index(feature_id)
+        rng = np.random.default_rng((self._dataset.config.seed, feature_index))
+        # Values are drawn for every spot of the dataset so that a spot gets
+        # the same value whichever region it is fetched for
+        values = rng.random(self._dataset.total_spots) * 1000.0
+        present = rng.random(self._dataset.total_spots) >= self._dataset.config.sparsity
+        spot_ids = spot_ids[present[spot_ids]]
+        return FeatureIntensities(spot_ids=spot_ids, values=values[spot_ids])
+
+
+class SyntheticDataset:
+    def __init__(self, config: SyntheticConfig):
+        self.config = config
+        self.total_spots = config.regions * config.spots_per_region
+        self.width = int(np.ceil(np.sqrt(self.total_spots)))
+        self.feature_table = SyntheticFeatureTable(self)
+
+    def region_spot_ids(self, region_id: str) -> np.ndarray:
+        if region_id == ROOT_REGION_ID:
+            return np.arange(self.total_spots)
+        index = int(region_id.rsplit("_", 1)[1])
+        start = index * self.config.spots_per_region
+        return np.arange(start, start + self.config.spots_per_region)
+
+    def get_region_tree(self) -> _RegionNode:
+        return _RegionNode(
+            ROOT_REGION_ID,
+            "Regions",
+            [
+                _RegionNode(f"region_{i}", f"Regions/Region {i}")
+                for i in range(self.config.regions)
+            ],
+        )
+
+    def get_region_spots(self, region_id: str) -> dict[str, np.ndarray]:
+        spot_ids = self.region_spot_ids(region_id)
+        return {
+            "spot_id": spot_ids,
+            "x": spot_ids % self.width,
+            "y": spot_ids // self.width,
+        }
+
+
+class SyntheticSession:
+    """
+    Drop-in replacement for ``LocalSession`` on a ``SyntheticDataset``.
+    """
+
+    def __init__(self, config: SyntheticConfig):
+        self.dataset_proxy = SyntheticDataset(config)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -0,0 +1,10 @@
+import os
+
+
+def user_cache_dir(*parts: str) -> str:
+    """
+    Per-user cache directory of the application, under %LOCALAPPDATA% on
+    Windows and ~/.cache elsewhere.
+    """
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pbp", *parts)
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from export_writers import get_writer
+from scils_utils import BASE_COLUMNS, Region, build_region_frame
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ExportCheckpoint:
+    """
+    Staging area that makes an export resumable.
+
+    Every finished region is saved to ``<output>.staging/`` as a ``.npz`` file
+    and recorded in a manifest. The manifest also records the identity of the
+    export (SLX file size and mtime, feature list, regions and columns); a
+    restarted export with the same identity skips the regions already staged.
+    Once all regions are done the output is assembled in the staging area and
+    moved into place, so a crash never leaves a half-written output behind.
+    """
+
+    # Whether the staged regions are removed once the output is assembled
+    remove_staging = True
+
+    def __init__(
+        self,
+        output_path: str,
+        slx_filepath: str,
+        feature_list_id: str,
+        region_list: list[Region],
+        columns: list[str],
+    ):
+        self.output_path = output_path
+        self.staging_dir = output_path + ".staging"
+        stat = os.stat(slx_filepath)
+        self.identity = {
+            "slx_filepath": os.path.abspath(slx_filepath),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "feature_list_id": str(feature_list_id),
+            "region_ids": [str(region.id) for region in region_list],
+            "columns": [str(column) for column in columns],
+        }
+        self.completed: dict[str, str] = {}
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.staging_dir, MANIFEST_NAME)
+
+    def open(self, log: callable = print):
+        """
+        Load the manifest of a previous run of the same export, or start a
+        fresh staging area when there is none or it belongs to another export.
+        """
+        try:
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+
+        if manifest is not None and manifest.get("identity") == self.identity:
+            self.completed = {
+                region_id: file_name
+                for region_id, file_name in manifest.get("completed", {}).items()
+                if os.path.exists(os.path.join(self.staging_dir, file_name))
+            }
+            log(f"Resuming export, {len(self.completed)} regions already done")
+            return
+
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        os.makedirs(self.staging_dir)
+        self.completed = {}
+        self._write_manifest()
+
+    def _manifest(self) -> dict:
+        return {"identity": self.identity, "completed": self.completed}
+
+    def _write_manifest(self):
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest(), f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _file_name(self, region: Region) -> str:
+        return f"region_{self.identity['region_ids'].index(str(region.id)):06d}.npz"
+
+    def is_done(self, region_id: str) -> bool:
+        return str(region_id) in self.completed
+
+    def save_region(self, region: Region, frame: pd.DataFrame):
+        """
+        Stage the block of a finished region and record it in the manifest.
+        """
+        file_name = self._file_name(region)
+        tmp_path = os.path.join(self.staging_dir, file_name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                spot_ids=frame["spotId"].to_numpy(),
+                x=frame["x"].to_numpy(),
+                y=frame["y"].to_numpy(),
+                feature_block=frame.iloc[:, len(BASE_COLUMNS):].to_numpy(),
+            )
+        os.replace(tmp_path, os.path.join(self.staging_dir, file_name))
+        self.completed[str(region.id)] = file_name
+        self._write_manifest()
+
+    def assemble(self, region_list: list[Region], output_format: str = None, csv_options: dict = None) -> int:
+        """
+        Merge the staged regions, in the order of ``region_list``, into the
+        output file and, unless ``remove_staging`` is off, remove the staging
+        area. Returns the number of rows.
+        """
+        assembly_dir = os.path.join(self.staging_dir, "assembled")
+        shutil.rmtree(assembly_dir, ignore_errors=True)
+        os.makedirs(assembly_dir)
+
+        # Writers may produce sidecar files next to the output, so the whole
+        # output is written to a directory of its own and moved afterwards
+        tmp_output = os.path.join(assembly_dir, os.path.basename(self.output_path))
+        if output_format is None:
+            output_format = os.path.splitext(self.output_path)[1]
+        with get_writer(tmp_output, self.identity["columns"], output_format, csv_options=csv_options) as writer:
+            for region in region_list:
+                file_name = self.completed.get(str(region.id))
+                if file_name is None:
+                    continue
+                with np.load(os.path.join(self.staging_dir, file_name)) as staged:
+                    writer.write_block(build_region_frame(
+                        region,
+                        staged["spot_ids"],
+                        staged["x"],
+                        staged["y"],
+                        staged["feature_block"],
+                        self.identity["columns"],
+                    ))
+
+        output_dir = os.path.dirname(os.path.abspath(self.output_path))
+        for file_name in os.listdir(assembly_dir):
+            os.replace(os.path.join(assembly_dir, file_name), os.path.join(output_dir, file_name))
+        shutil.rmtree(self.staging_dir if self.remove_staging else assembly_dir, ignore_errors=True)
+        return writer.rows_written
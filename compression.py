@@ -0,0 +1,129 @@
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Output suffixes compressed on the fly and their compression
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+# Uncompressed bytes compressed per task
+COMPRESS_BLOCK_SIZE = 4 * 1024**2
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def split_compression(path: str) -> tuple[str, str]:
+    """
+    Split a compression suffix off ``path``, e.g. ``"out.csv.gz"`` gives
+    ``("out.csv", "gzip")``. The compression is None for other paths.
+    """
+    root, extension = os.path.splitext(path)
+    compression = COMPRESSIONS.get(extension.lower())
+    if compression is None:
+        return path, None
+    return root, compression
+
+
+def default_compress_workers() -> int:
+    return min(4, os.cpu_count() or 1)
+
+
+def _compress_gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compress_zstd(data: bytes) -> bytes:
+    import zstandard
+
+    # Compressor objects must not be shared between threads
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def _get_compressor(compression: str) -> callable:
+    if compression == "gzip":
+        return _compress_gzip
+    if compression == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Writing .zst files requires the 'zstandard' package.") from e
+        return _compress_zstd
+    raise ValueError(f"Unsupported compression '{compression}'")
+
+
+class CompressedStream(io.RawIOBase):
+    """
+    Binary stream that compresses what is written to it into ``raw``.
+
+    Data is cut into blocks of ``COMPRESS_BLOCK_SIZE`` bytes that are
+    compressed by a pool of ``workers`` threads (zlib and zstd release the
+    GIL) and written to ``raw`` in order. Every block becomes a gzip member or
+    zstd frame of its own; a sequence of those is a valid file that the usual
+    tools decompress as a whole. At most two blocks per worker are held in
+    memory, nothing uncompressed is written to disk.
+    """
+
+    def __init__(self, raw, compression: str, workers: int = None):
+        super().__init__()
+        self._compress = _get_compressor(compression)
+        self._raw = raw
+        self.workers = workers or default_compress_workers()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= COMPRESS_BLOCK_SIZE:
+            self._submit(bytes(self._buffer[:COMPRESS_BLOCK_SIZE]))
+            del self._buffer[:COMPRESS_BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block: bytes):
+        self._pending.append(self._executor.submit(self._compress, block))
+        if len(self._pending) > 2 * self.workers:
+            self._write_next()
+
+    def _write_next(self):
+        compressed = self._pending.popleft().result()
+        self._raw.write(compressed)
+        self.bytes_written += len(compressed)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._write_next()
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+            self._raw.close()
+            super().close()
+
+
+def open_compressed_text(
+    path: str,
+    compression: str,
+    workers: int = None,
+    buffering: int = -1,
+    encoding: str = "utf-8",
+    **text_options,
+):
+    """
+    Open ``path`` for writing text that is compressed with ``compression``
+    on the fly, encoded as ``encoding`` rather than the locale encoding.
+    Returns the text file and the underlying ``CompressedStream``.
+    """
+    # Fail on a missing compressor before the file is created
+    _get_compressor(compression)
+    stream = CompressedStream(open(path, "wb"), compression, workers)
+    buffer_size = buffering if buffering > 0 else io.DEFAULT_BUFFER_SIZE
+    return io.TextIOWrapper(io.BufferedWriter(stream, buffer_size), encoding=encoding, **text_options), stream
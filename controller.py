@@ -8,12 +8,25 @@ from PyQt6.QtWidgets import (
     QLineEdit,
     QComboBox,
     QMessageBox,
+    QSpinBox,
+    QListWidget,
+    QAbstractItemView,
+    QCheckBox,
 )
 from Worker import Worker
 from feature_loading_handler import FeatureLoadingHandler
 from logger_service import logger
-from export_handler import ExportHandler
 from PyQt6.QtCore import pyqtSignal
+from export_writers import (
+    LAYOUT_AGGREGATE,
+    LAYOUT_IMAGE,
+    LAYOUT_LONG,
+    LAYOUT_SPARSE,
+    LAYOUT_WIDE,
+    available_writers,
+    output_extension,
+)
+import os
 
 
 class Controller(QWidget):
@@ -21,10 +34,13 @@ class Controller(QWidget):
     Controller class for managing the GUI inputs for the input slx, output csv location
     and the dropdown selection for the feature list
     """
-    def __init__(self, threadpool):
+    def __init__(self, threadpool, spot_prefetcher=None):
         super().__init__()
         self.layout = QVBoxLayout()
         self.threadpool = threadpool
+        # Loads the region spots of the selected file in the background
+        self.spot_prefetcher = spot_prefetcher
+        self.loading_file_path = ""
         
         # Initialize data handler
         self.data_handler = FeatureLoadingHandler()
@@ -79,10 +95,47 @@ class Controller(QWidget):
         feature_label.setMinimumWidth(100)
         feature_label.setMaximumWidth(100)
         feature_layout.addWidget(feature_label)
-        self.feature_combo_box = QComboBox()
-        self.feature_combo_box.setPlaceholderText("Select Feature...")
-        self.feature_combo_box.setEnabled(False)
-        feature_layout.addWidget(self.feature_combo_box, 1)
+        # Several lists are exported in a single pass over the regions
+        self.feature_list_widget = QListWidget()
+        self.feature_list_widget.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
+        self.feature_list_widget.setMaximumHeight(110)
+        self.feature_list_widget.setEnabled(False)
+        feature_layout.addWidget(self.feature_list_widget, 1)
+        self.combined_check_box = QCheckBox("One combined file")
+        self.combined_check_box.setToolTip(
+            "Write the features of all selected lists to one file instead of one file per list"
+        )
+        feature_layout.addWidget(self.combined_check_box)
+
+        # Worker processes used by the export, 1 exports on the GUI's worker thread
+        workers_layout = QHBoxLayout()
+        workers_layout.setSpacing(10)
+        workers_label = QLabel("⚙️ Workers:")
+        workers_label.setMinimumWidth(100)
+        workers_label.setMaximumWidth(100)
+        workers_layout.addWidget(workers_label)
+        self.workers_spin_box = QSpinBox()
+        self.workers_spin_box.setRange(1, os.cpu_count() or 1)
+        self.workers_spin_box.setValue(1)
+        workers_layout.addWidget(self.workers_spin_box)
+        # Off by default, the intensity cache may take up to 10 GB of disk
+        self.cache_check_box = QCheckBox("Cache intensities")
+        self.cache_check_box.setToolTip(
+            "Keep the fetched intensities on disk so that exporting the same file and feature list again is faster"
+        )
+        workers_layout.addWidget(self.cache_check_box)
+        workers_layout.addStretch(1)
+
+        # Shape of the output, the sparse matrix is written as .npz
+        layout_label = QLabel("📐 Layout:")
+        workers_layout.addWidget(layout_label)
+        self.layout_combo_box = QComboBox()
+        self.layout_combo_box.addItem("Wide (one column per feature)", LAYOUT_WIDE)
+        self.layout_combo_box.addItem("Long (spot, feature, value)", LAYOUT_LONG)
+        self.layout_combo_box.addItem("Sparse matrix (.npz)", LAYOUT_SPARSE)
+        self.layout_combo_box.addItem("Aggregate (statistics per region)", LAYOUT_AGGREGATE)
+        self.layout_combo_box.addItem("Ion-image cube (.npy)", LAYOUT_IMAGE)
+        workers_layout.addWidget(self.layout_combo_box)
         
         # Run Button
         self.run_button = QPushButton("🚀 Start Export")
@@ -92,6 +145,7 @@ class Controller(QWidget):
         self.layout.addLayout(slx_layout)
         self.layout.addLayout(csv_layout)
         self.layout.addLayout(feature_layout)
+        self.layout.addLayout(workers_layout)
         self.layout.addWidget(self.run_button)
 
         self._setup_signals()
@@ -100,12 +154,9 @@ class Controller(QWidget):
     def _setup_signals(self):
         """Connect signals from data handler to GUI methods"""
         self.data_handler.features_loaded.connect(self._on_features_loaded)
+        self.data_handler.features_checked.connect(self._on_features_checked)
         self.data_handler.error_occurred.connect(self._on_error_occurred)
         self.data_handler.warning_occurred.connect(self._on_warning_occurred)
-        self.feature_combo_box.currentIndexChanged.connect(self.handle_index_change)
-    
-    def handle_index_change(self):
-        print(self.feature_combo_box.currentIndex())
 
     def _on_features_loaded(self, feature_lists, regions):
         """Handle successful feature loading - runs on main thread"""
@@ -115,9 +166,25 @@ class Controller(QWidget):
         print(message)
         logger.log_info(message)
 
-        self.feature_combo_box.setEnabled(True)
-        self.feature_combo_box.clear()
-        self.feature_combo_box.addItems([feature_list.name for feature_list in self.feature_lists])
+        # Keep the selection when a cached list is refreshed from the SLX file
+        selected_names = {item.text() for item in self.feature_list_widget.selectedItems()}
+        self.feature_list_widget.setEnabled(True)
+        self.feature_list_widget.clear()
+        self.feature_list_widget.addItems([feature_list.name for feature_list in self.feature_lists])
+        for row in range(self.feature_list_widget.count()):
+            item = self.feature_list_widget.item(row)
+            item.setSelected(item.text() in selected_names)
+
+    def _on_features_checked(self, file_path):
+        """Prefetch the spots once the loader no longer uses the session - runs on main thread
+
+        The GUI may already be filled from the metadata cache, but a stale
+        entry is reloaded through the same session, which must not be used
+        by the prefetch at the same time.
+        """
+        if self.spot_prefetcher is not None and file_path == self.loading_file_path:
+            worker = Worker(self.spot_prefetcher.prefetch, file_path, self.regions, logger.log_info)
+            self.threadpool.start(worker)
     
     def _on_error_occurred(self, error_type, message):
         """Handle errors - runs on main thread"""
@@ -168,12 +235,38 @@ class Controller(QWidget):
             return self.csv_file_path.text()
         return ""
 
+    def get_selected_feature_lists(self):
+        rows = sorted(index.row() for index in self.feature_list_widget.selectedIndexes())
+        return [self.feature_lists[row] for row in rows]
+
+    def get_combined(self):
+        return self.combined_check_box.isChecked()
+
+    def get_use_cache(self):
+        return self.cache_check_box.isChecked()
+
+    def get_worker_count(self):
+        return self.workers_spin_box.value()
+
+    def get_layout(self):
+        return self.layout_combo_box.currentData()
+
     def load_features_from_file(self, file_path):
         """Load features using the data handler in a worker thread"""
         if not file_path:
-            self.feature_combo_box.setEnabled(False)
+            self.feature_list_widget.setEnabled(False)
             return
-        
+
+        # Spots prefetched for another file are of no use anymore
+        if self.spot_prefetcher is not None and file_path != self.loading_file_path:
+            self.spot_prefetcher.cancel()
+        self.loading_file_path = file_path
+
+        # Fill the GUI from the metadata cache right away, the worker then
+        # checks whether the SLX file changed and reloads it if needed
+        if self.data_handler.load_cached_features_and_regions(file_path):
+            logger.log_info(f"Loaded cached features of: {file_path}, checking for changes")
+
         logger.log_info(f"Starting to load features from: {file_path}")
         worker = Worker(self.data_handler.load_features_and_regions, file_path)
         self.threadpool.start(worker)
@@ -191,7 +284,16 @@ class Controller(QWidget):
     def select_csv_file(self):
         file_dialog = QFileDialog()
         file_dialog.setFileMode(QFileDialog.FileMode.AnyFile)
-        file_dialog.setNameFilter("CSV files (*.csv)")
+        # The export format is picked from the extension of the output file,
+        # formats whose optional packages are missing are not offered
+        writers = available_writers()
+        file_dialog.setNameFilters([writer.file_filter() for writer in writers.values()])
         if file_dialog.exec():
             selected_file = file_dialog.selectedFiles()[0]
+            if output_extension(selected_file)[0] not in writers:
+                selected_filter = file_dialog.selectedNameFilter()
+                for extension, writer in writers.items():
+                    if writer.file_filter() == selected_filter:
+                        selected_file += extension
+                        break
             self.csv_file_path.setText(selected_file)
\ No newline at end of file
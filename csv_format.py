@@ -0,0 +1,98 @@
+"""
+Fast CSV formatting of export blocks.
+
+Produces the same text as ``DataFrame.to_csv(header=False, index=False)``
+for the column types of an export (integers, floats, strings and
+dictionary-encoded strings), but formats only the present float values,
+every category once, and joins the rows column-wise. ``format_rows`` is a
+plain function of arrays so that chunks can be formatted in worker
+processes.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+# Line ending of every CSV line, the default of DataFrame.to_csv
+LINE_TERMINATOR = os.linesep
+
+# Characters that make the csv module quote a field
+_QUOTE_CHARS = (",", '"', "\n", "\r")
+
+
+def _format_floats(values: np.ndarray, float_precision: int, na_rep: str) -> list[str]:
+    if float_precision is not None:
+        values = np.round(values, float_precision)
+    missing = np.isnan(values)
+    present = values[~missing]
+    if values.dtype == np.float64:
+        # repr is the shortest round-trip text, as written by to_csv
+        formatted = list(map(repr, present.tolist()))
+    else:
+        formatted = present.astype(str).tolist()
+    if not missing.any():
+        return formatted
+    column = np.full(len(values), na_rep, dtype=object)
+    column[~missing] = formatted
+    return column.tolist()
+
+
+def _format_strings(values: np.ndarray, na_rep: str) -> list[str]:
+    column = []
+    for value in values.tolist():
+        if value is None or (isinstance(value, float) and value != value):
+            column.append(na_rep)
+            continue
+        value = str(value)
+        if any(char in value for char in _QUOTE_CHARS):
+            value = '"' + value.replace('"', '""') + '"'
+        column.append(value)
+    return column
+
+
+def _column_values(column: pd.Series):
+    # Categoricals are kept as codes and categories instead of one object per row
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.array
+    return column.to_numpy()
+
+
+def _kind(values) -> str:
+    if isinstance(values, pd.Categorical):
+        return values.categories.to_numpy().dtype.kind
+    return values.dtype.kind
+
+
+def can_format(block: pd.DataFrame) -> bool:
+    """
+    Whether every column of ``block`` has a type ``format_rows`` handles.
+    """
+    return all(_kind(_column_values(column)) in "biufOSU" for _, column in block.items())
+
+
+def block_columns(block: pd.DataFrame) -> list:
+    return [_column_values(column) for _, column in block.items()]
+
+
+def _format_column(values, float_precision: int, na_rep: str) -> list[str]:
+    if isinstance(values, pd.Categorical):
+        categories = _format_column(values.categories.to_numpy(), float_precision, na_rep)
+        # Code -1 marks a missing value
+        formatted = np.array(categories + [na_rep], dtype=object)
+        return formatted[values.codes].tolist()
+    if values.dtype.kind == "f":
+        return _format_floats(values, float_precision, na_rep)
+    if values.dtype.kind in "biu":
+        return values.astype(str).tolist()
+    return _format_strings(values, na_rep)
+
+
+def format_rows(columns: list, float_precision: int = None, na_rep: str = "") -> str:
+    """
+    Format the rows given as one array (or ``pd.Categorical``) per column as
+    CSV text, with floats rounded to ``float_precision`` decimals when given
+    and missing values written as ``na_rep``.
+    """
+    if not columns or len(columns[0]) == 0:
+        return ""
+    formatted = [_format_column(values, float_precision, na_rep) for values in columns]
+    return LINE_TERMINATOR.join(map(",".join, zip(*formatted))) + LINE_TERMINATOR
@@ -1,15 +1,70 @@
 from PyQt6.QtCore import pyqtSignal, QObject
 import time
 from logger_service import logger
-from scils_utils import generate_csv
+from export_writers import LAYOUT_WIDE
 
 class ExportHandler(QObject):
     export_finished = pyqtSignal()
     export_progress = pyqtSignal(int)
 
-    def __init__(self):
+    def __init__(self, cache_budget=None, spot_prefetcher=None):
         super().__init__()
+        self.cache_budget = cache_budget
+        self.spot_prefetcher = spot_prefetcher
+        self._intensity_cache = None
 
-    def start_export(self, regions, features, slx_file_path, csv_file_path):
-        generate_csv(slx_file_path, csv_file_path, regions, features, export_progress=self.export_progress)
+    @property
+    def intensity_cache(self):
+        # Repeated exports of the same SLX file and feature list are served
+        # from this cache instead of the SCiLS backend when the user enables
+        # it. Created on the first such export so that numpy is not loaded
+        # before the window is shown.
+        if self._intensity_cache is None:
+            from intensity_cache import IntensityCache
+
+            if self.cache_budget is None:
+                self._intensity_cache = IntensityCache()
+            else:
+                self._intensity_cache = IntensityCache(max_bytes=self.cache_budget)
+        return self._intensity_cache
+
+    def start_export(self, regions, features, slx_file_path, csv_file_path, output_format=None, workers=1, checkpoint=False, layout=LAYOUT_WIDE, incremental=False, use_cache=False):
+        from scils_utils import generate_csv
+
+        generate_csv(
+            slx_file_path,
+            csv_file_path,
+            regions,
+            features,
+            export_progress=self.export_progress.emit,
+            output_format=output_format,
+            workers=workers,
+            cache=self.intensity_cache if use_cache else None,
+            log=logger.log_info,
+            checkpoint=checkpoint,
+            report=True,
+            layout=layout,
+            incremental=incremental,
+            spot_prefetcher=self.spot_prefetcher,
+        )
+        self.export_finished.emit()
+
+    def start_multi_export(self, regions, feature_lists, slx_file_path, csv_file_path, combined=False, output_format=None, workers=1, layout=LAYOUT_WIDE, use_cache=False):
+        from multi_export import export_feature_lists
+
+        export_feature_lists(
+            slx_file_path,
+            csv_file_path,
+            regions,
+            feature_lists,
+            export_progress=self.export_progress.emit,
+            combined=combined,
+            output_format=output_format,
+            workers=workers,
+            cache=self.intensity_cache if use_cache else None,
+            log=logger.log_info,
+            report=True,
+            layout=layout,
+            spot_prefetcher=self.spot_prefetcher,
+        )
         self.export_finished.emit()
\ No newline at end of file
@@ -0,0 +1,122 @@
+import json
+import time
+from contextlib import contextmanager
+
+# Minimum number of seconds between two live progress summaries
+LIVE_SUMMARY_INTERVAL = 5.0
+
+
+class ExportStats:
+    """
+    Per-stage timing and throughput of an export.
+
+    Stages (``get_region_spots``, ``get_feature_intensities``, ``fill``,
+    ``dataframe``, ``write``) are timed with the ``stage`` context manager,
+    which accumulates wall time, call counts and processed spots per stage and
+    per region. Writers update ``bytes_written``. ``region_done`` logs a live summary with throughput and ETA
+    through the ``log`` callback at most every ``LIVE_SUMMARY_INTERVAL``
+    seconds, and ``write_report`` dumps everything as JSON.
+    """
+
+    def __init__(self, total_regions: int, log: callable = print):
+        self.total_regions = total_regions
+        self.log = log
+        self.started = time.perf_counter()
+        self.finished = None
+        self.stages: dict[str, dict] = {}
+        self.regions: list[dict] = []
+        self.bytes_written = 0
+        self._current_region = None
+        self._last_summary = self.started
+
+    @staticmethod
+    def _new_stage() -> dict:
+        return {"seconds": 0.0, "calls": 0, "spots": 0}
+
+    @contextmanager
+    def stage(self, name: str, calls: int = 1, spots: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, calls, spots)
+
+    def add(self, name: str, seconds: float, calls: int = 1, spots: int = 0):
+        targets = [self.stages]
+        if self._current_region is not None:
+            targets.append(self._current_region["stages"])
+        for stages in targets:
+            stage = stages.setdefault(name, self._new_stage())
+            stage["seconds"] += seconds
+            stage["calls"] += calls
+            stage["spots"] += spots
+
+    def merge(self, stages: dict[str, dict]):
+        """
+        Add stage timings measured elsewhere, e.g. in a worker process.
+        """
+        for name, stage in stages.items():
+            self.add(name, stage["seconds"], stage["calls"], stage["spots"])
+
+    def region_started(self, region):
+        self._current_region = {
+            "id": str(region.id),
+            "name": region.name,
+            "spots": 0,
+            "stages": {},
+            "started": time.perf_counter(),
+            "bytes_at_start": self.bytes_written,
+        }
+
+    def region_done(self, spots: int = 0):
+        region = self._current_region
+        if region is not None:
+            region["spots"] = spots
+            region["seconds"] = time.perf_counter() - region.pop("started")
+            region["bytes"] = self.bytes_written - region.pop("bytes_at_start")
+            self.regions.append(region)
+            self._current_region = None
+
+        now = time.perf_counter()
+        if now - self._last_summary >= LIVE_SUMMARY_INTERVAL or len(self.regions) == self.total_regions:
+            self._last_summary = now
+            self.log(self.summary_line())
+
+    def summary_line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        done = len(self.regions)
+        spots = sum(region["spots"] for region in self.regions)
+        line = (
+            f"{done}/{self.total_regions} regions, {spots / elapsed if elapsed else 0:,.0f} spots/s, "
+            f"{self.bytes_written / 1024**2:,.1f} MB written"
+        )
+        if 0 < done < self.total_regions:
+            eta = elapsed / done * (self.total_regions - done)
+            line += f", ETA {eta:,.0f}s"
+        return line
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def to_dict(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(stage)
+            if stage["spots"] and stage["seconds"]:
+                stages[name]["spots_per_second"] = stage["spots"] / stage["seconds"]
+        if "write" in stages:
+            stages["write"]["bytes"] = self.bytes_written
+        return {
+            "seconds": elapsed,
+            "regions": len(self.regions),
+            "total_regions": self.total_regions,
+            "spots": sum(region["spots"] for region in self.regions),
+            "bytes_written": self.bytes_written,
+            "stages": stages,
+            "per_region": self.regions,
+        }
+
+    def write_report(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
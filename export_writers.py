@@ -0,0 +1,544 @@
+import importlib.util
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+from compression import open_compressed_text, split_compression
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# numpy, pandas and csv_format are imported by the writers when they are
+# used, the GUI only needs the formats and layouts defined here at startup
+
+# Layouts of an export: one row per spot and column per feature, one row per
+# non-missing (spot, feature, value) triple, a sparse spots x features matrix,
+# one row of per-feature statistics per region, or an ion-image cube (written
+# by image_cube, not by a writer)
+LAYOUT_WIDE = "wide"
+LAYOUT_LONG = "long"
+LAYOUT_SPARSE = "sparse"
+LAYOUT_AGGREGATE = "aggregate"
+LAYOUT_IMAGE = "image"
+LAYOUTS = (LAYOUT_WIDE, LAYOUT_LONG, LAYOUT_SPARSE, LAYOUT_AGGREGATE, LAYOUT_IMAGE)
+
+# Values of a block formatted at once, or per task by the CSV format workers.
+# The formatted text takes about 60 bytes per value as Python strings before
+# it is joined.
+FORMAT_CHUNK_VALUES = 100_000
+# Buffer of the CSV file, text is written in large chunks
+CSV_WRITE_BUFFER = 8 * 1024**2
+# Prefix of the hidden sibling an output is written to until it is complete
+PARTIAL_PREFIX = ".partial-"
+
+
+class ExportWriter:
+    """
+    Base class for the output formats of an export.
+
+    A writer is opened once with the final column layout, receives one block
+    (a DataFrame with exactly those columns) per region through
+    ``write_block`` and is closed at the end of the export.
+
+    Used as a context manager the output (and ``sidecar_paths``) is written
+    to a ``PARTIAL_PREFIX`` sibling and only moved to ``path`` once the
+    writer closed without error, a failed export leaves no truncated file.
+    """
+
+    extension = ""
+    name_filter = ""
+    # Layouts whose blocks the writer accepts
+    layouts = (LAYOUT_WIDE, LAYOUT_LONG, LAYOUT_AGGREGATE)
+    # Optional packages the format is written with, see is_available
+    requires: tuple[str, ...] = ()
+
+    def __init__(self, path: str, columns: list[str]):
+        self.path = path
+        self.columns = list(columns)
+        self.rows_written = 0
+
+    def open(self):
+        pass
+
+    def write_block(self, block: "pd.DataFrame"):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """
+        Release the output after a failed export, the file is removed.
+        """
+        self.close()
+
+    def sidecar_paths(self) -> list[str]:
+        """
+        Files written beside ``path``, named after it.
+        """
+        return []
+
+    def bytes_written(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """
+        Whether the packages in ``requires`` are installed, checked without
+        importing them.
+        """
+        return all(importlib.util.find_spec(name) is not None for name in cls.requires)
+
+    @classmethod
+    def file_filter(cls) -> str:
+        """
+        The ``name_filter`` offered by the file dialog.
+        """
+        return cls.name_filter
+
+    def __enter__(self):
+        self.final_path = self.path
+        directory, name = os.path.split(self.path)
+        self.path = os.path.join(directory, PARTIAL_PREFIX + name)
+        try:
+            self.open()
+        except BaseException:
+            self._discard()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            try:
+                self.abort()
+            finally:
+                self._discard()
+            return
+        try:
+            self.close()
+        except BaseException:
+            self._discard()
+            raise
+        partial_paths = [self.path] + self.sidecar_paths()
+        self.path = self.final_path
+        for partial_path in partial_paths:
+            directory, name = os.path.split(partial_path)
+            os.replace(partial_path, os.path.join(directory, name[len(PARTIAL_PREFIX):]))
+
+    def _discard(self):
+        for partial_path in [self.path] + self.sidecar_paths():
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        self.path = self.final_path
+
+
+class CsvWriter(ExportWriter):
+    """
+    Wide CSV, the historical output of the exporter.
+
+    Blocks are formatted by ``csv_format``, which produces the text of
+    ``DataFrame.to_csv`` faster, in chunks of ``FORMAT_CHUNK_VALUES`` values.
+    With ``format_workers`` above one the chunks are formatted by a process
+    pool and written in order. ``float_precision`` rounds floats to that
+    many decimals and ``na_rep`` is written for missing values.
+
+    With a ``compression`` (``"gzip"`` or ``"zstd"``, picked by ``get_writer``
+    from a ``.gz`` or ``.zst`` suffix) the text is compressed on the fly by
+    ``compress_workers`` threads, see ``compression.CompressedStream``.
+    """
+
+    extension = ".csv"
+    name_filter = "CSV files (*.csv *.csv.gz *.csv.zst)"
+
+    def __init__(
+        self,
+        path: str,
+        columns: list[str],
+        float_precision: int = None,
+        na_rep: str = "",
+        format_workers: int = 1,
+        compression: str = None,
+        compress_workers: int = None,
+    ):
+        super().__init__(path, columns)
+        self.float_precision = float_precision
+        self.na_rep = na_rep
+        self.format_workers = format_workers
+        self.compression = compression
+        self.compress_workers = compress_workers
+
+    @classmethod
+    def file_filter(cls) -> str:
+        # .zst output needs the optional zstandard package
+        if importlib.util.find_spec("zstandard") is None:
+            return cls.name_filter.replace(" *.csv.zst", "")
+        return cls.name_filter
+
+    def open(self):
+        self._stream = None
+        if self.compression is None:
+            # UTF-8 like DataFrame.to_csv, not the locale encoding (cp1252 on Windows)
+            self._file = open(self.path, "w", newline="", buffering=CSV_WRITE_BUFFER, encoding="utf-8")
+        else:
+            self._file, self._stream = open_compressed_text(
+                self.path, self.compression, self.compress_workers, CSV_WRITE_BUFFER,
+                encoding="utf-8", newline="",
+            )
+        import pandas as pd
+        from csv_format import LINE_TERMINATOR
+
+        pd.DataFrame(columns=self.columns).to_csv(self._file, index=False, lineterminator=LINE_TERMINATOR)
+        self._pending = deque()
+        self._executor = None
+        if self.format_workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.format_workers)
+
+    def write_block(self, block: "pd.DataFrame"):
+        import csv_format
+
+        if not csv_format.can_format(block):
+            self._write_pending()
+            if self.float_precision is not None:
+                block = block.round(self.float_precision)
+            block.to_csv(
+                self._file, header=False, index=False, na_rep=self.na_rep,
+                lineterminator=csv_format.LINE_TERMINATOR,
+            )
+        else:
+            # Chunks bound the formatted text held in memory at once, however
+            # wide the block is
+            columns = csv_format.block_columns(block)
+            chunk_rows = max(1, FORMAT_CHUNK_VALUES // max(1, len(columns)))
+            for start in range(0, len(block), chunk_rows):
+                chunk = [values[start:start + chunk_rows] for values in columns]
+                if self._executor is None:
+                    self._file.write(csv_format.format_rows(chunk, self.float_precision, self.na_rep))
+                    continue
+                self._pending.append(self._executor.submit(
+                    csv_format.format_rows, chunk, self.float_precision, self.na_rep
+                ))
+                # Bound the formatted text waiting to be written
+                if len(self._pending) > 2 * self.format_workers:
+                    self._file.write(self._pending.popleft().result())
+        self.rows_written += len(block)
+
+    def _write_pending(self):
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+
+    def bytes_written(self) -> int:
+        if self._stream is not None:
+            return self._stream.bytes_written
+        return self._file.tell()
+
+    def close(self):
+        try:
+            self._write_pending()
+        finally:
+            self.abort()
+
+    def abort(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        self._file.close()
+
+
+class _ArrowWriter(ExportWriter):
+    """Shared logic of the Arrow based writers (Parquet and Feather)."""
+
+    requires = ("pyarrow",)
+
+    def open(self):
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError(
+                f"Writing {self.extension} files requires the 'pyarrow' package."
+            ) from e
+        self._pa = pyarrow
+        self._schema = None
+        self._writer = None
+
+    @staticmethod
+    def _widen(block: "pd.DataFrame") -> "pd.DataFrame":
+        # Compact blocks narrow integers per region and dictionary-encode
+        # tissue_id, the file keeps one schema with the full types
+        import pandas as pd
+
+        conversions = {}
+        for name, dtype in block.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                conversions[name] = dtype.categories.dtype
+            elif dtype.kind in "iu" and dtype.itemsize < 8:
+                conversions[name] = "int64"
+        return block.astype(conversions) if conversions else block
+
+    def _to_table(self, block: "pd.DataFrame"):
+        block = self._widen(block)
+        if self._schema is None:
+            table = self._pa.Table.from_pandas(block, preserve_index=False)
+            self._schema = table.schema
+            self._writer = self._new_writer(self._schema)
+            return table
+        return self._pa.Table.from_pandas(block, schema=self._schema, preserve_index=False)
+
+    def _new_writer(self, schema):
+        raise NotImplementedError
+
+    def write_block(self, block: "pd.DataFrame"):
+        table = self._to_table(block)
+        self._writer.write_table(table)
+        self.rows_written += len(block)
+
+    def close(self):
+        if self._writer is None:
+            # No block was written, still produce a file with the column layout
+            import pandas as pd
+
+            self._to_table(pd.DataFrame(columns=self.columns))
+        self._writer.close()
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ParquetWriter(_ArrowWriter):
+    """Parquet file with one row group per region."""
+
+    extension = ".parquet"
+    name_filter = "Parquet files (*.parquet)"
+
+    def _new_writer(self, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, schema)
+
+
+class FeatherWriter(_ArrowWriter):
+    """Feather (Arrow IPC) file with one record batch per region."""
+
+    extension = ".feather"
+    name_filter = "Feather files (*.feather)"
+
+    def _new_writer(self, schema):
+        import pyarrow.ipc as ipc
+        return ipc.new_file(self.path, schema)
+
+
+class NpyBundleWriter(ExportWriter):
+    """
+    Raw float64 ``.npy`` matrix plus a JSON sidecar describing the columns.
+
+    ``tissue_id`` is stored as an integer code into the ``tissue_ids`` list of
+    the sidecar so that the whole table fits a single numeric matrix. The
+    header is written with a fixed size up front and rewritten with the final
+    row count on close, so blocks are appended straight to the file.
+    """
+
+    extension = ".npy"
+    name_filter = "NumPy bundle (*.npy)"
+    layouts = (LAYOUT_WIDE,)
+    dtype = "<f8"
+    # Large enough for any realistic shape, keeps the data offset fixed
+    _header_len = 128
+
+    def open(self):
+        self._file = open(self.path, "wb")
+        self._file.write(self._header(0))
+        self._tissue_codes: dict[str, int] = {}
+
+    def _header(self, rows: int) -> bytes:
+        header = repr({
+            "descr": self.dtype,
+            "fortran_order": False,
+            "shape": (rows, len(self.columns)),
+        })
+        magic = b"\x93NUMPY\x01\x00"
+        # magic + uint16 length + header, padded with spaces and ending in \n
+        body_len = self._header_len - len(magic) - 2
+        header = header.ljust(body_len - 1) + "\n"
+        return magic + body_len.to_bytes(2, "little") + header.encode("latin1")
+
+    def write_block(self, block: "pd.DataFrame"):
+        import numpy as np
+        import pandas as pd
+
+        if "tissue_id" in block.columns:
+            for tissue_id in pd.unique(block["tissue_id"]):
+                self._tissue_codes.setdefault(tissue_id, len(self._tissue_codes))
+            block = block.assign(tissue_id=block["tissue_id"].map(self._tissue_codes))
+        matrix = np.ascontiguousarray(block.to_numpy(dtype=self.dtype))
+        self._file.write(matrix.tobytes())
+        self.rows_written += len(block)
+
+    def bytes_written(self) -> int:
+        return self._file.tell()
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header(self.rows_written))
+        self._file.close()
+
+        sidecar = {
+            "columns": self.columns,
+            "shape": [self.rows_written, len(self.columns)],
+            "dtype": self.dtype,
+            "tissue_ids": list(self._tissue_codes),
+        }
+        with open(self.sidecar_paths()[0], "w") as f:
+            json.dump(sidecar, f, indent=2)
+
+    def abort(self):
+        self._file.close()
+
+    def sidecar_paths(self) -> list[str]:
+        return [os.path.splitext(self.path)[0] + ".json"]
+
+
+class SparseMatrixWriter(ExportWriter):
+    """
+    Compressed sparse row (spots x features) matrix in a ``.npz`` file that
+    ``scipy.sparse.load_npz`` can read.
+
+    Blocks are ``SparseRegionBlock`` objects (see ``scils_utils``) and
+    ``columns`` are the feature names. The row metadata (``spot_id``, ``x``,
+    ``y`` and ``tissue_id`` as a code into ``tissue_ids``) and the
+    ``feature_names`` are stored as extra arrays of the same file. Only the
+    non-missing values are kept, the matrix is written on close.
+    """
+
+    extension = ".npz"
+    name_filter = "Sparse matrix (*.npz)"
+    layouts = (LAYOUT_SPARSE,)
+
+    def open(self):
+        self._parts = {name: [] for name in ("data", "indices", "row_counts", "spot_id", "x", "y", "tissue_id")}
+        self._tissue_codes: dict[str, int] = {}
+
+    def write_block(self, block):
+        import numpy as np
+
+        num_spots = len(block)
+        code = self._tissue_codes.setdefault(block.tissue_id, len(self._tissue_codes))
+        # Entries of a block are sorted by row, so they can be appended as is
+        self._parts["data"].append(block.block.values)
+        self._parts["indices"].append(block.block.cols.astype(np.int32))
+        self._parts["row_counts"].append(np.bincount(block.block.rows, minlength=num_spots))
+        self._parts["spot_id"].append(np.asarray(block.spot_ids))
+        self._parts["x"].append(np.asarray(block.x))
+        self._parts["y"].append(np.asarray(block.y))
+        self._parts["tissue_id"].append(np.full(num_spots, code, dtype=np.int32))
+        self.rows_written += num_spots
+
+    def _concat(self, name: str, dtype):
+        import numpy as np
+
+        parts = self._parts[name]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    def close(self):
+        import numpy as np
+
+        row_counts = self._concat("row_counts", np.int64)
+        indptr = np.zeros(self.rows_written + 1, dtype=np.int64)
+        np.cumsum(row_counts, out=indptr[1:])
+        with open(self.path, "wb") as f:
+            np.savez_compressed(
+                f,
+                format=np.array("csr"),
+                shape=np.array([self.rows_written, len(self.columns)]),
+                data=self._concat("data", np.float64),
+                indices=self._concat("indices", np.int32),
+                indptr=indptr,
+                spot_id=self._concat("spot_id", np.int64),
+                x=self._concat("x", np.int64),
+                y=self._concat("y", np.int64),
+                tissue_id=self._concat("tissue_id", np.int32),
+                tissue_ids=np.array(list(self._tissue_codes), dtype=str),
+                feature_names=np.array(self.columns, dtype=str),
+            )
+        self._parts = None
+
+    def abort(self):
+        self._parts = None
+
+
+WRITERS: dict[str, type[ExportWriter]] = {
+    writer.extension: writer
+    for writer in (CsvWriter, ParquetWriter, FeatherWriter, NpyBundleWriter, SparseMatrixWriter)
+}
+
+
+def available_writers() -> dict[str, type[ExportWriter]]:
+    """
+    The writers of ``WRITERS`` whose optional packages are installed, e.g.
+    without pyarrow there is no Parquet or Feather output.
+    """
+    return {extension: writer for extension, writer in WRITERS.items() if writer.is_available()}
+
+
+def check_output(path: str, layout: str = LAYOUT_WIDE, output_format: str = None) -> type[ExportWriter] | None:
+    """
+    Check that the output format of ``path``, or ``output_format`` when
+    given, can hold ``layout`` and return its writer class, None for the
+    ``LAYOUT_IMAGE`` cube which has its own writer. Raises a ``ValueError``
+    otherwise, e.g. so that the GUI can reject an output before the export
+    starts.
+    """
+    extension, compression = output_extension(path, output_format)
+    if layout == LAYOUT_IMAGE:
+        if (extension, compression) != (NpyBundleWriter.extension, None):
+            raise ValueError(f"The {LAYOUT_IMAGE} layout is written as a {NpyBundleWriter.extension} cube")
+        return None
+    if extension not in WRITERS:
+        raise ValueError(
+            f"Unsupported output format '{extension}'. "
+            f"Supported formats: {', '.join(WRITERS)}"
+        )
+    writer = WRITERS[extension]
+    if layout not in writer.layouts:
+        supported = [ext for ext, candidate in WRITERS.items() if layout in candidate.layouts]
+        raise ValueError(
+            f"The '{extension}' format does not support the {layout} layout. "
+            f"Supported formats: {', '.join(supported)}"
+        )
+    if compression is not None and not issubclass(writer, CsvWriter):
+        raise ValueError(f"Only CSV output can be compressed, not '{extension}'")
+    return writer
+
+
+def get_writer(
+    path: str,
+    columns: list[str],
+    output_format: str = None,
+    layout: str = LAYOUT_WIDE,
+    csv_options: dict = None,
+) -> ExportWriter:
+    """
+    Return the writer for ``path``, picked from its extension unless an
+    explicit ``output_format`` (e.g. ``"parquet"``) is given. A ``.gz`` or
+    ``.zst`` suffix (``"csv.gz"`` as format) compresses the CSV output.
+    Raises a ``ValueError`` when the format cannot hold ``layout``, see
+    ``check_output``. ``csv_options`` are passed on to ``CsvWriter`` and
+    ignored by the other formats.
+    """
+    writer = check_output(path, layout, output_format)
+    if issubclass(writer, CsvWriter):
+        _, compression = output_extension(path, output_format)
+        return writer(path, columns, compression=compression, **(csv_options or {}))
+    return writer(path, columns)
+
+
+def output_extension(path: str, output_format: str = None) -> tuple[str, str]:
+    """
+    Return the writer extension (e.g. ``".csv"``) and the compression of an
+    output, from ``output_format`` when given and from ``path`` otherwise.
+    """
+    name = "output." + output_format.lstrip(".") if output_format else path
+    name, compression = split_compression(name)
+    extension = os.path.splitext(name)[1].lower()
+    if compression is not None and not extension:
+        # "gz" alone means compressed CSV
+        extension = CsvWriter.extension
+    return extension, compression
@@ -8,6 +8,8 @@ from PyQt6.QtWidgets import (
     QStatusBar,
 )
 import os
+import importlib
+import multiprocessing
 from PyQt6.QtCore import QThreadPool, QTimer
 from PyQt6.QtGui import QIcon
 from controller import Controller
@@ -15,7 +17,22 @@ from output import OutputWidget
 from logger_service import logger
 import sys
 from export_handler import ExportHandler
+from export_writers import LAYOUT_IMAGE, check_output
 from Worker import Worker
+from session_manager import session_manager
+from spot_prefetch import SpotPrefetcher
+
+# Heavy modules of loading and exporting, imported on a worker thread once the
+# window is shown so that neither startup nor the first export waits for them
+PRELOAD_MODULES = ("numpy", "pandas", "scils_utils", "intensity_cache", "scilslab")
+
+
+def preload_modules(names=PRELOAD_MODULES):
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.log_debug(f"Could not preload {name}: {e}")
 
 
 class MainWindow(QMainWindow):
@@ -37,7 +54,10 @@ class MainWindow(QMainWindow):
         self.status_bar.showMessage("Ready to export pixel data", 5000)
         
         self.ThreadPool = QThreadPool()
-        self.export_handler = ExportHandler()
+        # Shared by the controller, which starts it once a file is loaded,
+        # and the exports, which read the prefetched spots
+        self.spot_prefetcher = SpotPrefetcher()
+        self.export_handler = ExportHandler(spot_prefetcher=self.spot_prefetcher)
         self._setup_ui()
         
         # Welcome timer
@@ -58,19 +78,30 @@ class MainWindow(QMainWindow):
         y = (screen.height() - window.height()) // 2
         self.move(x, y)
 
+    def start_preload(self):
+        """Import the heavy modules in the background"""
+        self.ThreadPool.start(Worker(preload_modules))
+
     def handle_export_progress(self, value):
         """Handle export progress updates"""
         self.output.update_progress(value)
 
     def handle_export_finished(self):
-        logger.info_message.emit("Export Finished!")
+        logger.log_info("Export Finished!")
         self.status_bar.showMessage("✅ Export completed successfully!", 10000)
         QMessageBox.information(
             self, "Export Complete", "The export process has finished successfully."
         )
 
+    def handle_export_error(self, error):
+        """Report an export that raised on its worker thread"""
+        exctype, value, traceback_str = error
+        logger.log_error(f"Export failed: {traceback_str}")
+        self.status_bar.showMessage("❌ Export failed", 10000)
+        QMessageBox.critical(self, "Export Failed", f"{exctype.__name__}: {value}")
+
     def handle_export(self):
-        logger.info_message.emit("Export Started!")
+        logger.log_info("Export Started!")
         self.status_bar.showMessage("🚀 Export in progress...", 0)
         regions = self.controller.get_region_list()
         if len(regions) == 0:
@@ -81,7 +112,7 @@ class MainWindow(QMainWindow):
                 "No regions found in the SLX file. Please add regions and try again.",
             )
             return
-        self.output.progress_bar.setRange(0, len(regions) - 1)
+        self.output.progress_bar.setRange(0, len(regions))
         feature_lists = self.controller.get_feature_lists()
         if len(feature_lists) == 0:
             QMessageBox.warning(
@@ -90,20 +121,54 @@ class MainWindow(QMainWindow):
                 "No Features found in the SLX file. Please add features and try again.",
             )
             return
-        if self.controller.feature_combo_box.currentIndex() < 0:
+        selected_lists = self.controller.get_selected_feature_lists()
+        if not selected_lists:
             QMessageBox.critical(
                 self,
                 "No Feature List Selected",
                 "Please select a feature list to export.",
             )
             return
-        worker = Worker(
-            self.export_handler.start_export,
-            regions,
-            feature_lists[self.controller.feature_combo_box.currentIndex()],
-            self.controller.get_slx_filepath(),
-            self.controller.get_csv_filepath(),
-        )
+        layout = self.controller.get_layout()
+        try:
+            # The layout and the extension of the output are picked separately
+            check_output(self.controller.get_csv_filepath(), layout)
+        except ValueError as e:
+            self.status_bar.showMessage("❌ Unsupported output", 5000)
+            QMessageBox.critical(self, "Unsupported Output", f"{e}\n\nPlease choose another output file or layout.")
+            return
+        if len(selected_lists) == 1:
+            worker = Worker(
+                self.export_handler.start_export,
+                regions,
+                selected_lists[0],
+                self.controller.get_slx_filepath(),
+                self.controller.get_csv_filepath(),
+                workers=self.controller.get_worker_count(),
+                layout=layout,
+                use_cache=self.controller.get_use_cache(),
+            )
+        else:
+            if layout == LAYOUT_IMAGE:
+                QMessageBox.critical(
+                    self,
+                    "Single Feature List Only",
+                    "The ion-image cube exports a single feature list, please select one.",
+                )
+                return
+            # All selected lists are exported in one pass over the regions
+            worker = Worker(
+                self.export_handler.start_multi_export,
+                regions,
+                selected_lists,
+                self.controller.get_slx_filepath(),
+                self.controller.get_csv_filepath(),
+                combined=self.controller.get_combined(),
+                workers=self.controller.get_worker_count(),
+                layout=layout,
+                use_cache=self.controller.get_use_cache(),
+            )
+        worker.signals.error.connect(self.handle_export_error)
         self.ThreadPool.start(worker)
 
     def _setup_ui(self):
@@ -119,7 +184,7 @@ class MainWindow(QMainWindow):
         main_widget.setLayout(main_layout)
         
         # Create controller widget
-        self.controller = Controller(self.ThreadPool)
+        self.controller = Controller(self.ThreadPool, self.spot_prefetcher)
         self.controller.run_button.clicked.connect(self.handle_export)
         
         # Create output widget
@@ -134,10 +199,7 @@ class MainWindow(QMainWindow):
         self._setup_signals()
 
     def _setup_signals(self):
-        logger.info_message.connect(self.output.append_info)
-        logger.warning_message.connect(self.output.append_warning)
-        logger.error_message.connect(self.output.append_error)
-        logger.debug_message.connect(self.output.append_debug)
+        self.output.attach_logger(logger)
 
         # Export signals
         self.export_handler.export_progress.connect(self.handle_export_progress)
@@ -145,6 +207,8 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    # Needed by the export worker processes in the frozen executable
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
 
     # Get the correct path for both development and compiled versions
@@ -167,4 +231,9 @@ if __name__ == "__main__":
     
     window = MainWindow()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    # Runs once the event loop has drawn the window
+    QTimer.singleShot(0, window.start_preload)
+    exit_code = app.exec()
+    window.spot_prefetcher.cancel()
+    session_manager.close_all()
+    sys.exit(exit_code)
\ No newline at end of file
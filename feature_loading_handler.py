@@ -1,6 +1,6 @@
 from PyQt6.QtCore import QObject, pyqtSignal
-from scilslab import LocalSession
-from scils_utils import get_feature_lists, get_region_list
+from session_manager import session_manager
+from metadata_cache import MetadataCache
 
 
 class FeatureLoadingHandler(QObject):
@@ -8,11 +8,49 @@ class FeatureLoadingHandler(QObject):
 
     # Signals to communicate with the main thread
     features_loaded = pyqtSignal(list, list)  # features, regions
+    # The loader is done with the session of the file, which is up to date
+    features_checked = pyqtSignal(str)  # file_path
     error_occurred = pyqtSignal(str, str)  # error_type, message
     warning_occurred = pyqtSignal(
         str, int, int
     )  # message, total_regions, unique_regions
 
+    def __init__(self):
+        super().__init__()
+        self.metadata_cache = MetadataCache()
+
+    def _emit_loaded(self, features, regions):
+        """Check the regions and hand features and regions to the GUI"""
+        print(f"Found {len(regions)} leaf regions")
+
+        # Check for duplicate region names
+        region_name_set = set([region.name for region in regions])
+        if len(region_name_set) != len(regions):
+            self.warning_occurred.emit(
+                f"Duplicate region names found in the SLX file. Please ensure all region names are unique to avoid issues.",
+                len(regions),
+                len(region_name_set),
+            )
+
+        self.features_loaded.emit(features, regions)
+
+    def load_cached_features_and_regions(self, file_path):
+        """Fill the GUI from the metadata cache - runs on main thread
+
+        Returns True when a cached entry was found. It may be stale, the
+        worker started afterwards with load_features_and_regions checks it.
+        """
+        if not file_path:
+            return False
+
+        cached = self.metadata_cache.load(file_path)
+        if cached is None:
+            return False
+
+        print(f"Loaded cached features from: {file_path}")
+        self._emit_loaded(*cached)
+        return True
+
     def load_features_and_regions(self, file_path):
         """Load features and regions from SLX file - runs in worker thread"""
         print(f"Loading features from: {file_path}")
@@ -20,24 +58,23 @@ class FeatureLoadingHandler(QObject):
         if not file_path:
             return
 
+        if self.metadata_cache.is_fresh(file_path):
+            print(f"Cached features of {file_path} are up to date")
+            self.features_checked.emit(file_path)
+            return
+
+        # Loaded here rather than at startup, it pulls in pandas and numpy
+        from scils_utils import get_feature_lists, get_region_list
+
         try:
-            session = LocalSession(file_path)
-            features = get_feature_lists(session, file_path)
-            regions = get_region_list(session, file_path)
-
-            print(f"Found {len(regions)} leaf regions")
-
-            # Check for duplicate region names
-            region_name_set = set([region.name for region in regions])
-            if len(region_name_set) != len(regions):
-                self.warning_occurred.emit(
-                    f"Duplicate region names found in the SLX file. Please ensure all region names are unique to avoid issues.",
-                    len(regions),
-                    len(region_name_set),
-                )
-
-            session.close()
-            self.features_loaded.emit(features, regions)
+            # The session stays open for the export, see session_manager
+            with session_manager.session(file_path) as session:
+                features = get_feature_lists(session, file_path)
+                regions = get_region_list(session, file_path)
+
+            self.metadata_cache.store(file_path, features, regions)
+            self._emit_loaded(features, regions)
+            self.features_checked.emit(file_path)
 
         except Exception as e:
             self.error_occurred.emit(
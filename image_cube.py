@@ -0,0 +1,269 @@
+import json
+import os
+import shutil
+import numpy as np
+from export_stats import ExportStats
+from export_writers import LAYOUT_IMAGE, ExportWriter
+from scils_utils import (
+    Feature,
+    Region,
+    build_spot_index,
+    gather_feature_entries,
+    ignore,
+    load_region_spots,
+)
+
+# Files written beside the cube, named after it without the .npy extension
+METADATA_SUFFIX = ".json"
+MASKS_SUFFIX = ".masks.npy"
+SPOTS_SUFFIX = ".spots.npy"
+# Region index of the pixels of the masks plane that lie in no region
+NO_REGION = -1
+# Pixels of the grid per rasterized spot above which the coordinates are taken
+# to not lie on a regular grid (a stray spot off the pitch makes the step tiny)
+MAX_PIXELS_PER_SPOT = 100
+
+
+def _grid_axis(coordinates: np.ndarray) -> tuple[np.ndarray, dict]:
+    """
+    Map spot coordinates onto pixel indices of a regular grid, the step is
+    the smallest distance between two distinct coordinates.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    distinct = np.unique(coordinates)
+    steps = np.diff(distinct)
+    step = float(steps.min()) if len(steps) else 1.0
+    origin = float(distinct[0]) if len(distinct) else 0.0
+    indices = np.rint((coordinates - origin) / step).astype(np.intp)
+    size = int(indices.max()) + 1 if len(indices) else 0
+    return indices, {"origin": origin, "step": step, "size": size}
+
+
+def cube_paths(path: str) -> dict[str, str]:
+    root = os.path.splitext(path)[0]
+    return {
+        "cube": path,
+        "metadata": root + METADATA_SUFFIX,
+        "masks": root + MASKS_SUFFIX,
+        "spots": root + SPOTS_SUFFIX,
+    }
+
+
+def check_cube_size(path: str, shape: tuple[int, int, int], dtype: np.dtype, spots: int):
+    """
+    Refuse a cube whose grid is mostly empty or that does not fit the free
+    space of the disk of ``path``, before any file is created.
+    """
+    pixels = shape[0] * shape[1]
+    if pixels > MAX_PIXELS_PER_SPOT * max(1, spots):
+        raise ValueError(
+            f"The {shape[0]} x {shape[1]} grid has more than {MAX_PIXELS_PER_SPOT} pixels per spot "
+            f"({spots:,} spots), the spot coordinates do not lie on a regular grid"
+        )
+    # The cube plus the masks and spots planes
+    size = pixels * (shape[2] * dtype.itemsize + np.dtype(np.int32).itemsize + np.dtype(np.int64).itemsize)
+    free = shutil.disk_usage(os.path.dirname(os.path.abspath(path))).free
+    if size > free:
+        raise ValueError(
+            f"The image cube needs {size / 1024**3:,.2f} GB but only {free / 1024**3:,.2f} GB "
+            f"are free at {path}"
+        )
+
+
+class ImageCubeWriter(ExportWriter):
+    """
+    The cube of ``export_image_cube`` with its metadata, masks and spots.
+
+    The cube is memory mapped and filled region by region through
+    ``write_region``, the masks (region index per pixel, ``NO_REGION`` where
+    there is none, leaf regions do not overlap) and the spot id per pixel
+    are kept in memory and saved on close.
+    """
+
+    extension = ".npy"
+    layouts = (LAYOUT_IMAGE,)
+
+    def __init__(
+        self,
+        path: str,
+        columns: list[str],
+        shape: tuple[int, int, int],
+        dtype: np.dtype,
+        regions: list[Region],
+        x_axis: dict,
+        y_axis: dict,
+    ):
+        super().__init__(path, columns)
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.regions = regions
+        self.x_axis = x_axis
+        self.y_axis = y_axis
+
+    def open(self):
+        self.cube = np.lib.format.open_memmap(
+            self.path, mode="w+", dtype=self.dtype, shape=self.shape, fortran_order=True
+        )
+        for k in range(self.shape[2]):
+            # Plane by plane, every write is contiguous
+            self.cube[:, :, k] = np.nan
+        self.masks = np.full(self.shape[:2], NO_REGION, dtype=np.int32)
+        self.spot_map = np.full(self.shape[:2], -1, dtype=np.int64)
+
+    def write_region(
+        self,
+        index: int,
+        rows: np.ndarray,
+        columns: np.ndarray,
+        spot_ids: np.ndarray,
+        entries: tuple[np.ndarray, np.ndarray, np.ndarray],
+    ):
+        """
+        Scatter the ``(spot, feature, value)`` entries of the region at
+        ``index`` of ``regions`` onto the pixels of its spots.
+        """
+        entry_spots, entry_features, values = entries
+        self.cube[rows[entry_spots], columns[entry_spots], entry_features] = values
+        self.masks[rows, columns] = index
+        self.spot_map[rows, columns] = spot_ids
+        self.rows_written += len(spot_ids)
+
+    def flush(self):
+        self.cube.flush()
+
+    def sidecar_paths(self) -> list[str]:
+        paths = cube_paths(self.path)
+        return [paths["metadata"], paths["masks"], paths["spots"]]
+
+    def bytes_written(self) -> int:
+        return sum(
+            os.path.getsize(file) for file in [self.path] + self.sidecar_paths() if os.path.exists(file)
+        )
+
+    def close(self):
+        self.cube.flush()
+        self.cube = None
+        paths = cube_paths(self.path)
+        np.save(paths["masks"], self.masks)
+        np.save(paths["spots"], self.spot_map)
+        metadata = {
+            "shape": list(self.shape),
+            "dtype": self.dtype.str,
+            "order": "F",
+            "x": self.x_axis,
+            "y": self.y_axis,
+            "features": self.columns,
+            "regions": [
+                {"id": str(region.id), "name": region.name, "tissue_id": region.name.split("/")[-1]}
+                for region in self.regions
+            ],
+        }
+        with open(paths["metadata"], "w") as f:
+            json.dump(metadata, f, indent=2)
+
+    def abort(self):
+        # Unmap the cube so that the partial file can be removed
+        self.cube = None
+
+
+def export_image_cube(
+    dataset,
+    feature_table,
+    region_list: list[Region],
+    features: list[Feature],
+    path: str,
+    export_progress: callable,
+    discarded_regions: list[Region],
+    dtype=np.float64,
+    log: callable = print,
+    stats: ExportStats = None,
+) -> int:
+    """
+    Rasterize the intensities of every feature onto the 2-D spot grid.
+
+    The spots of all regions are loaded first to lay out the grid from their
+    x and y coordinates. The cube (height x width x features, NaN where a
+    pixel has no value) is a ``.npy`` file at ``path`` stored in Fortran
+    order, so the ion image of a feature is one contiguous chunk of the file:
+    ``np.load(path, mmap_mode="r")[:, :, k]`` reads a single image without
+    loading the cube. It is filled in place through a memory map, one region
+    at a time, by scattering the fetched intensities onto the pixels of
+    their spots. Beside it are a JSON file with the grid, feature names and
+    regions, the masks (index of the region of every pixel, -1 where there
+    is none) and the spot id of every pixel (-1 where there is none). All
+    four are written by an ``ImageCubeWriter`` and only appear once the
+    export succeeded. Raises a ``ValueError`` when the grid is not regular or
+    the cube does not fit on the disk. Returns the number of spots
+    rasterized.
+    """
+    stats = stats or ExportStats(len(region_list), log=ignore)
+    dtype = np.dtype(dtype)
+
+    region_spots = {}
+    for region in region_list:
+        with stats.stage("get_region_spots"):
+            spots = load_region_spots(dataset, region)
+        if len(spots[0]) == 0:
+            log(f"Region id:{region.id} and Region name: {region.name} has no valid spots.")
+            discarded_regions.append(region)
+            continue
+        region_spots[region.id] = spots
+    regions = [region for region in region_list if region.id in region_spots]
+    mask_index = {region.id: i for i, region in enumerate(regions)}
+
+    all_x = np.concatenate([region_spots[region.id][1] for region in regions]) if regions else np.empty(0)
+    all_y = np.concatenate([region_spots[region.id][2] for region in regions]) if regions else np.empty(0)
+    columns, x_axis = _grid_axis(all_x)
+    rows, y_axis = _grid_axis(all_y)
+    shape = (y_axis["size"], x_axis["size"], len(features))
+    log(
+        f"Rasterizing {len(features)} features onto a {shape[0]} x {shape[1]} grid "
+        f"({shape[0] * shape[1] * shape[2] * dtype.itemsize / 1024**3:,.2f} GB) at {path}"
+    )
+    check_cube_size(path, shape, dtype, len(all_x))
+
+    writer = ImageCubeWriter(
+        path, [feature.name for feature in features], shape, dtype, regions, x_axis, y_axis
+    )
+    with writer:
+        offset = 0
+        for i, region in enumerate(region_list):
+            if region.id not in region_spots:
+                continue
+            log(f"Processing region {i + 1}/{len(region_list)}: {region.name}")
+            export_progress(i)
+            stats.region_started(region)
+
+            region_spot_ids = region_spots[region.id][0]
+            num_spots = len(region_spot_ids)
+            region_rows = rows[offset:offset + num_spots]
+            region_columns = columns[offset:offset + num_spots]
+            offset += num_spots
+            with stats.stage("get_feature_intensities", calls=len(features), spots=num_spots):
+                feature_intensities = [
+                    feature_table.get_feature_intensities(feature_row.id, region.id)
+                    for feature_row in features
+                ]
+            with stats.stage("fill", spots=num_spots):
+                entries = gather_feature_entries(build_spot_index(region_spot_ids), feature_intensities)
+                writer.write_region(
+                    mask_index[region.id], region_rows, region_columns, region_spot_ids, entries
+                )
+            stats.region_done(num_spots)
+        with stats.stage("write", spots=offset):
+            writer.flush()
+    stats.bytes_written = writer.bytes_written()
+
+    export_progress(len(region_list))
+    return offset
+
+
+def load_ion_image(path: str, feature: str | int) -> np.ndarray:
+    """
+    Read the ion image of ``feature`` (a name or index) from a cube written
+    by ``export_image_cube`` without loading the others.
+    """
+    if not isinstance(feature, (int, np.integer)):
+        with open(cube_paths(path)["metadata"]) as f:
+            feature = json.load(f)["features"].index(feature)
+    return np.array(np.load(path, mmap_mode="r")[:, :, feature])
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from checkpoint import ExportCheckpoint
+from scils_utils import Region
+
+# Directory beside the output holding the blocks of the exported regions
+DELTA_SUFFIX = ".delta"
+
+
+def region_fingerprint(spot_ids) -> dict:
+    """
+    Spot count and hash of the spot ids of a region, a region whose
+    fingerprint changed is exported again.
+    """
+    spot_ids = np.ascontiguousarray(spot_ids, dtype=np.int64)
+    return {
+        "spot_count": int(len(spot_ids)),
+        "spot_hash": hashlib.sha1(spot_ids.tobytes()).hexdigest(),
+    }
+
+
+class IncrementalExport(ExportCheckpoint):
+    """
+    Keeps the block of every exported region in ``<output>.delta/`` so that
+    the next export of the same feature list only recomputes new or changed
+    regions.
+
+    The manifest records the SLX file, the feature list, the columns and, per
+    region, the fingerprint (``region_fingerprint``) of its spots. Regions whose
+    fingerprint still matches reuse their stored block, the others are
+    exported and stored again, and the output is assembled from all blocks
+    in the current region order. The intensities of an unchanged region are
+    assumed unchanged, another SLX file, feature list or feature set starts
+    over.
+    Since blocks are stored as soon as a region is done, an interrupted
+    export resumes like a checkpointed one.
+    """
+
+    remove_staging = False
+
+    def __init__(
+        self,
+        output_path: str,
+        slx_filepath: str,
+        feature_list_id: str,
+        region_list: list[Region],
+        columns: list[str],
+        fingerprints: dict[str, dict],
+    ):
+        self.output_path = output_path
+        self.staging_dir = output_path + DELTA_SUFFIX
+        self.identity = {
+            # Not its size and mtime, edited regions are told apart by fingerprint
+            "slx_filepath": os.path.abspath(slx_filepath),
+            "feature_list_id": str(feature_list_id),
+            "columns": [str(column) for column in columns],
+        }
+        self.region_ids = [str(region.id) for region in region_list]
+        self.fingerprints = fingerprints
+        self.completed: dict[str, str] = {}
+
+    def _manifest(self) -> dict:
+        return {
+            "identity": self.identity,
+            "completed": self.completed,
+            "fingerprints": {region_id: self.fingerprints[region_id] for region_id in self.completed},
+        }
+
+    def _file_name(self, region: Region) -> str:
+        return f"region_{hashlib.sha1(str(region.id).encode('utf-8')).hexdigest()[:16]}.npz"
+
+    def open(self, log: callable = print):
+        """
+        Keep the stored blocks of the regions that did not change since the
+        previous export and drop the others.
+        """
+        try:
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+
+        if manifest is None or manifest.get("identity") != self.identity:
+            if manifest is not None:
+                log("SLX file or feature list changed since the previous export, exporting all regions")
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+            os.makedirs(self.staging_dir)
+            self.completed = {}
+            self._write_manifest()
+            return
+
+        previous = manifest.get("completed", {})
+        stored_fingerprints = manifest.get("fingerprints", {})
+        self.completed = {
+            region_id: file_name
+            for region_id, file_name in previous.items()
+            if region_id in self.region_ids
+            and stored_fingerprints.get(region_id) == self.fingerprints.get(region_id)
+            and os.path.exists(os.path.join(self.staging_dir, file_name))
+        }
+        for region_id, file_name in previous.items():
+            if region_id not in self.completed:
+                try:
+                    os.remove(os.path.join(self.staging_dir, file_name))
+                except OSError:
+                    pass
+        self._write_manifest()
+
+        changed = sum(1 for region_id in previous if region_id in self.region_ids and region_id not in self.completed)
+        added = sum(
+            1 for region_id in self.region_ids
+            if region_id not in previous and self.fingerprints[region_id]["spot_count"]
+        )
+        removed = sum(1 for region_id in previous if region_id not in self.region_ids)
+        log(
+            f"Incremental export: {len(self.completed)} regions unchanged, "
+            f"{changed} changed, {added} new, {removed} removed"
+        )
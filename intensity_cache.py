@@ -0,0 +1,222 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from scils_utils import FeatureIntensities
+from cache_paths import user_cache_dir
+
+# Disk budget of the cache before the least recently used entries are evicted
+DEFAULT_CACHE_BUDGET = 10 * 1024**3
+# Fraction of the budget an eviction during an export frees the cache down to,
+# so that the following stores do not walk the cache directory again
+EVICT_TARGET = 0.9
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class IntensityCache:
+    """
+    Persistent on-disk cache of the arrays fetched from SCiLS during an export.
+
+    Every (feature, region) pair is stored as two ``.npy`` files (spot ids and
+    values) that are memory-mapped when read back. Entries are grouped under a
+    key made of the SLX path, size and modification time plus the feature list
+    id, so any change to the SLX file invalidates them. A store that would
+    grow the cache beyond ``max_bytes`` first evicts the least recently used
+    entries, and is skipped when they cannot make room for it.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_CACHE_BUDGET):
+        self.cache_dir = cache_dir or user_cache_dir("intensities")
+        self.max_bytes = max_bytes
+        # Size of the cache on disk, read on the first store. Other processes
+        # sharing the directory are only accounted for by the next eviction.
+        self._bytes = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def __getstate__(self):
+        # Sent to the worker processes of a parallel export
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, slx_filepath: str, feature_list_id: str) -> str:
+        stat = os.stat(slx_filepath)
+        return _digest(os.path.abspath(slx_filepath), stat.st_size, stat.st_mtime_ns, feature_list_id)
+
+    def _entry_path(self, key: str, *parts) -> str:
+        return os.path.join(self.cache_dir, key, _digest(*parts))
+
+    def _load(self, path: str, names: tuple[str, ...]) -> list[np.ndarray] | None:
+        files = [f"{path}.{name}.npy" for name in names]
+        if not all(os.path.exists(file) for file in files):
+            self.misses += 1
+            return None
+        try:
+            arrays = [np.load(file, mmap_mode="r") for file in files]
+        except (OSError, ValueError):
+            # Truncated or concurrently evicted entry, fetch it again
+            self.misses += 1
+            return None
+        for file in files:
+            # The modification time doubles as the LRU access time
+            os.utime(file)
+        self.hits += 1
+        return arrays
+
+    def _reserve(self, size: int) -> bool:
+        """
+        Account for ``size`` new bytes, evicting entries when they would
+        exceed the budget. Returns False when they do not fit.
+        """
+        with self._lock:
+            if size > self.max_bytes:
+                return False
+            if self._bytes is None:
+                self._bytes = self.size()
+            if self._bytes + size > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_TARGET) - size)
+                if self._bytes + size > self.max_bytes:
+                    return False
+            self._bytes += size
+            return True
+
+    def _store(self, path: str, arrays: dict[str, np.ndarray]):
+        arrays = {name: np.asarray(array) for name, array in arrays.items()}
+        if not self._reserve(sum(array.nbytes for array in arrays.values())):
+            # Served from the backend again next time
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for name, array in arrays.items():
+            # Write to a temporary file first so readers never see partial data
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp_path, f"{path}.{name}.npy")
+
+    def get_intensities(self, key: str, feature_id: str, region_id: str) -> FeatureIntensities | None:
+        arrays = self._load(self._entry_path(key, "intensities", feature_id, region_id), ("spot_ids", "values"))
+        if arrays is None:
+            return None
+        return FeatureIntensities(spot_ids=arrays[0], values=arrays[1])
+
+    def put_intensities(self, key: str, feature_id: str, region_id: str, intensities):
+        self._store(
+            self._entry_path(key, "intensities", feature_id, region_id),
+            {"spot_ids": intensities.spot_ids, "values": intensities.values},
+        )
+
+    def get_region_spots(self, key: str, region_id: str) -> dict[str, np.ndarray] | None:
+        arrays = self._load(self._entry_path(key, "spots", region_id), ("spot_id", "x", "y"))
+        if arrays is None:
+            return None
+        return dict(zip(("spot_id", "x", "y"), arrays))
+
+    def put_region_spots(self, key: str, region_id: str, region_spots):
+        self._store(
+            self._entry_path(key, "spots", region_id),
+            {name: region_spots.get(name) for name in ("spot_id", "x", "y")},
+        )
+
+    def wrap(self, dataset, key: str) -> "CachedDataset":
+        return CachedDataset(dataset, self, key)
+
+    def size(self) -> int:
+        return sum(size for _, _, size in self._files())
+
+    def _files(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache fits its budget.
+        """
+        with self._lock:
+            self._evict(self.max_bytes)
+
+    def _evict(self, max_bytes: int):
+        files = sorted(self._files(), key=lambda file: file[1])
+        total = sum(size for _, _, size in files)
+        for path, _, size in files:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Still memory-mapped by a running export (Windows)
+                continue
+            total -= size
+        self._bytes = total
+
+        for root, dirs, files in os.walk(self.cache_dir, topdown=False):
+            if root != self.cache_dir and not dirs and not files:
+                os.rmdir(root)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._bytes = None
+
+
+class CachedFeatureTable:
+    """
+    Feature table proxy that serves ``get_feature_intensities`` from the cache.
+    """
+
+    def __init__(self, feature_table, cache: IntensityCache, key: str):
+        self._feature_table = feature_table
+        self._cache = cache
+        self._key = key
+
+    def get_feature_intensities(self, feature_id, region_id):
+        intensities = self._cache.get_intensities(self._key, feature_id, region_id)
+        if intensities is None:
+            intensities = self._feature_table.get_feature_intensities(feature_id, region_id)
+            self._cache.put_intensities(self._key, feature_id, region_id, intensities)
+        return intensities
+
+    def __getattr__(self, name):
+        return getattr(self._feature_table, name)
+
+
+class CachedDataset:
+    """
+    Dataset proxy that serves ``get_region_spots`` and the feature intensities
+    from the cache and forwards everything else to the SCiLS dataset.
+    """
+
+    def __init__(self, dataset, cache: IntensityCache, key: str):
+        self._dataset = dataset
+        self._cache = cache
+        self._key = key
+        self.feature_table = CachedFeatureTable(dataset.feature_table, cache, key)
+
+    def get_region_spots(self, region_id):
+        region_spots = self._cache.get_region_spots(self._key, region_id)
+        if region_spots is None:
+            region_spots = self._dataset.get_region_spots(region_id)
+            self._cache.put_region_spots(self._key, region_id, region_spots)
+        return region_spots
+
+    def __getattr__(self, name):
+        return getattr(self._dataset, name)
@@ -1,43 +1,92 @@
-from PyQt6.QtCore import QObject, pyqtSignal
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from cache_paths import user_cache_dir
 
+# Messages kept for the GUI, older ones are dropped when it falls behind
+LOG_BUFFER_SIZE = 10_000
+LOG_FILE_MAX_BYTES = 5 * 1024**2
+LOG_FILE_BACKUPS = 3
 
-from PyQt6.QtCore import QObject, pyqtSignal
 
-
-class LoggerService(QObject):
+class LoggerService:
     """
     Centralized logging service that can be used throughout the application
+
+    Messages can be logged from any thread. They go to the console and a
+    rotating log file right away, and into a bounded ring buffer that the GUI
+    drains in batches with ``drain`` instead of receiving one signal per
+    message.
     """
-    
-    # Signals for different types of messages
-    info_message = pyqtSignal(str)
-    warning_message = pyqtSignal(str)
-    error_message = pyqtSignal(str)
-    debug_message = pyqtSignal(str)
-    
-    def __init__(self):
-        super().__init__()
-    
+
+    def __init__(self, log_file: str = None, buffer_size: int = LOG_BUFFER_SIZE):
+        self._buffer = deque(maxlen=buffer_size)
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self.log_file = log_file or user_cache_dir("logs", "pbp.log")
+
+        self._logger = logging.getLogger("pbp")
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            # No console in the windowed executable
+            if sys.stdout is not None:
+                console = logging.StreamHandler(sys.stdout)
+                console.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+                self._logger.addHandler(console)
+            try:
+                os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+                file_handler = RotatingFileHandler(
+                    self.log_file,
+                    maxBytes=LOG_FILE_MAX_BYTES,
+                    backupCount=LOG_FILE_BACKUPS,
+                    encoding="utf-8",
+                )
+            except OSError:
+                self.log_file = None
+            else:
+                file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+                self._logger.addHandler(file_handler)
+
+    def _log(self, level: int, message: str):
+        self._logger.log(level, message)
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._dropped += 1
+            self._buffer.append((level, time.time(), message))
+
+    def drain(self) -> tuple[list[tuple[int, float, str]], int]:
+        """
+        Return the buffered ``(level, timestamp, message)`` entries and the
+        number of messages dropped since the last call, and clear the buffer.
+        """
+        with self._lock:
+            entries = list(self._buffer)
+            dropped = self._dropped
+            self._buffer.clear()
+            self._dropped = 0
+        return entries, dropped
+
     def log_info(self, message: str):
         """Log an info message"""
-        print(f"INFO: {message}")
-        self.info_message.emit(message)
-    
+        self._log(logging.INFO, message)
+
     def log_warning(self, message: str):
         """Log a warning message"""
-        print(f"WARNING: {message}")
-        self.warning_message.emit(message)
-    
+        self._log(logging.WARNING, message)
+
     def log_error(self, message: str):
         """Log an error message"""
-        print(f"ERROR: {message}")
-        self.error_message.emit(message)
-    
+        self._log(logging.ERROR, message)
+
     def log_debug(self, message: str):
         """Log a debug message"""
-        print(f"DEBUG: {message}")
-        self.debug_message.emit(message)
+        self._log(logging.DEBUG, message)
 
 
 # Global logger instance - simple and reliable
-logger = LoggerService()
\ No newline at end of file
+logger = LoggerService()
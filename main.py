@@ -0,0 +1,338 @@
+"""
+Headless batch exporter.
+
+Exports feature lists of many SLX files without the GUI, e.g.
+
+    python main.py --feature-list "My features" --output-dir out --jobs 4 data/*.slx
+
+Several lists (``--feature-list`` repeated, or ``--all-feature-lists``) are
+exported in a single pass per file, see ``multi_export``.
+
+A JSON summary line is printed to stdout for every file, log messages go to
+stderr. This module must not import PyQt.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def _log_to_stderr(name: str):
+    def log(message: str):
+        print(f"[{name}] {message}", file=sys.stderr, flush=True)
+    return log
+
+
+def export_file(
+    slx_filepath: str,
+    feature_list_names: list[str] | None,
+    output_dir: str,
+    output_format: str = "csv",
+    workers: int = 1,
+    quiet: bool = False,
+    checkpoint: bool = False,
+    layout: str = "wide",
+    out_of_core: bool = False,
+    matrix_dtype: str = "float64",
+    csv_options: dict = None,
+    pipeline: bool = True,
+    incremental: bool = False,
+    percentiles: list[float] = None,
+    combined: bool = False,
+    fetch_strategy: str = "per_region",
+    output_name: str = None,
+) -> dict:
+    """
+    Export the feature lists named ``feature_list_names`` (all of them when
+    None) of every leaf region of ``slx_filepath`` and return a JSON
+    serializable summary of the run. The output is ``output_name`` (see
+    ``output_names``, the name of the SLX file by default) in ``output_dir``.
+    Several lists go to one file per list named after it, or to a single
+    file with ``combined``.
+    """
+    from region_aggregates import DEFAULT_PERCENTILES
+    from scils_utils import generate_csv, get_feature_lists, get_region_list
+    from session_manager import session_manager
+
+    name = os.path.basename(slx_filepath)
+    log = _log_to_stderr(name) if not quiet else (lambda message: None)
+    output_path = os.path.join(
+        output_dir,
+        (output_name or os.path.splitext(name)[0]) + "." + output_format.lstrip("."),
+    )
+    summary = {"file": slx_filepath, "output": output_path}
+
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with session_manager.session(slx_filepath) as session:
+            feature_lists = get_feature_lists(session, slx_filepath)
+            regions = get_region_list(session, slx_filepath)
+
+        if feature_list_names is not None:
+            by_name = {feature_list.name: feature_list for feature_list in feature_lists}
+            missing = [name for name in feature_list_names if name not in by_name]
+            if missing:
+                raise ValueError(
+                    f"Feature list '{missing[0]}' not found, available: "
+                    f"{', '.join(feature_list.name for feature_list in feature_lists)}"
+                )
+            feature_lists = [by_name[name] for name in dict.fromkeys(feature_list_names)]
+
+        percentiles = DEFAULT_PERCENTILES if percentiles is None else percentiles
+        if len(feature_lists) == 1:
+            results = {
+                output_path: generate_csv(
+                    slx_filepath,
+                    output_path,
+                    regions,
+                    feature_lists[0],
+                    fetch_strategy=fetch_strategy,
+                    workers=workers,
+                    log=log,
+                    checkpoint=checkpoint,
+                    report=True,
+                    layout=layout,
+                    out_of_core=out_of_core,
+                    matrix_dtype=matrix_dtype,
+                    csv_options=csv_options,
+                    pipeline=pipeline,
+                    incremental=incremental,
+                    percentiles=percentiles,
+                )
+            }
+        else:
+            if checkpoint or incremental or out_of_core:
+                raise ValueError("Checkpointed, incremental and out-of-core exports take a single feature list")
+            from multi_export import export_feature_lists
+
+            results = export_feature_lists(
+                slx_filepath,
+                output_path,
+                regions,
+                feature_lists,
+                combined=combined,
+                fetch_strategy=fetch_strategy,
+                workers=workers,
+                log=log,
+                report=True,
+                layout=layout,
+                matrix_dtype=matrix_dtype,
+                csv_options=csv_options,
+                pipeline=pipeline,
+                percentiles=percentiles,
+            )
+    except Exception as e:
+        summary.update(status="error", error=f"{type(e).__name__}: {e}")
+    else:
+        # The outputs of one pass share the discarded regions and stage timings
+        result = next(iter(results.values()))
+        summary.update(
+            status="ok",
+            rows=sum(result.rows for result in results.values()),
+            bytes=sum(os.path.getsize(path) for path in results),
+            discarded_regions=[region.name for region in result.discarded_regions],
+            stages={name: round(stage["seconds"], 3) for name, stage in result.stats["stages"].items()},
+        )
+        if list(results) != [output_path]:
+            summary["outputs"] = {path: result.rows for path, result in results.items()}
+    finally:
+        session_manager.close_all()
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    """
+    Expand the glob patterns given on the command line, keeping their order
+    and dropping duplicates.
+    """
+    files = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            # The same file given as different paths is exported once
+            files.setdefault(os.path.normcase(os.path.abspath(match)), match)
+    return list(files.values())
+
+
+def output_names(files: list[str]) -> list[str]:
+    """
+    Output name of every SLX file of ``files`` relative to the output
+    directory, without extension. Files are named after themselves, those
+    sharing a name, e.g. ``a/x.slx`` and ``b/x.slx``, keep their directory
+    relative to the common parent of the inputs: ``a/x`` and ``b/x``.
+    """
+    stems = [os.path.splitext(os.path.basename(file))[0] for file in files]
+    counts = {}
+    for stem in stems:
+        counts[os.path.normcase(stem)] = counts.get(os.path.normcase(stem), 0) + 1
+    if all(count == 1 for count in counts.values()):
+        return stems
+
+    directories = [os.path.dirname(os.path.abspath(file)) for file in files]
+    try:
+        root = os.path.commonpath(directories)
+    except ValueError:
+        # Inputs on different drives (Windows)
+        root = None
+    names = []
+    for stem, directory in zip(stems, directories):
+        if counts[os.path.normcase(stem)] == 1:
+            names.append(stem)
+            continue
+        if root is None:
+            drive, directory = os.path.splitdrive(directory)
+            relative = os.path.join(drive.strip(":\\/"), directory.lstrip("\\/"))
+        else:
+            relative = os.path.relpath(directory, root)
+        names.append(os.path.join(relative, stem))
+    return names
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export pixel-by-pixel feature intensities of SLX files.")
+    parser.add_argument("inputs", nargs="+", help="SLX files or glob patterns")
+    feature_lists = parser.add_mutually_exclusive_group(required=True)
+    feature_lists.add_argument(
+        "--feature-list",
+        action="append",
+        help="Name of a feature list to export, repeat it to export several lists in one pass",
+    )
+    feature_lists.add_argument(
+        "--all-feature-lists",
+        action="store_true",
+        help="Export every feature list of the files in one pass",
+    )
+    parser.add_argument(
+        "--combined",
+        action="store_true",
+        help="Write the features of several lists to one file instead of one file per list",
+    )
+    parser.add_argument("--output-dir", required=True, help="Directory the exports are written to")
+    from export_writers import LAYOUT_IMAGE, LAYOUT_SPARSE, LAYOUT_WIDE, LAYOUTS
+
+    parser.add_argument(
+        "--format",
+        help="Output format: csv, csv.gz, csv.zst, parquet, feather, npy or npz "
+        "(default: npz for the sparse layout, npy for the image layout, csv otherwise)",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=LAYOUTS,
+        default=LAYOUT_WIDE,
+        help="wide: one column per feature, long: one (spot, feature, value) row per intensity, "
+        "sparse: sparse spots x features matrix, aggregate: one row of per-feature statistics per region, "
+        "image: height x width x features ion-image cube with region masks",
+    )
+    parser.add_argument(
+        "--percentiles",
+        type=float,
+        nargs="+",
+        help="Percentiles of the aggregate layout besides the median (default: 25 75)",
+    )
+    parser.add_argument(
+        "--fetch-strategy",
+        choices=("per_region", "bulk", "auto"),
+        default="per_region",
+        help="per_region: one SCiLS call per region and feature, memory follows the largest region; "
+        "bulk: one call per feature for the whole dataset, holds the intensities of all regions; "
+        "auto: bulk when the regions cover most of the dataset and their intensities fit in memory",
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="Number of SLX files exported concurrently")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes per file")
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Stage finished regions so that an interrupted export resumes where it stopped",
+    )
+    parser.add_argument(
+        "--out-of-core",
+        action="store_true",
+        help="Fill a disk-backed matrix next to the output instead of in-memory blocks, for larger-than-RAM exports",
+    )
+    parser.add_argument(
+        "--matrix-dtype",
+        choices=("float64", "float32"),
+        default="float64",
+        help="Value type the intensities are held and written as (blocks, --out-of-core matrix, image cube)",
+    )
+    parser.add_argument("--float-precision", type=int, help="Round CSV values to this many decimals")
+    parser.add_argument("--na-rep", default="", help="Text written for missing CSV values")
+    parser.add_argument("--format-workers", type=int, default=1, help="Processes formatting the CSV text per file")
+    parser.add_argument("--compress-workers", type=int, help="Threads compressing .gz/.zst output per file")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep region blocks beside the output and only export regions that are new or changed",
+    )
+    parser.add_argument(
+        "--no-pipeline",
+        dest="pipeline",
+        action="store_false",
+        help="Fetch, assemble and write each region one after another instead of overlapping them",
+    )
+    parser.add_argument("--quiet", action="store_true", help="Only print the JSON summaries")
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = {LAYOUT_SPARSE: "npz", LAYOUT_IMAGE: "npy"}.get(args.layout, "csv")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("No SLX files found", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    export_kwargs = dict(
+        feature_list_names=args.feature_list,
+        output_dir=args.output_dir,
+        output_format=args.format,
+        workers=args.workers,
+        quiet=args.quiet,
+        checkpoint=args.checkpoint,
+        layout=args.layout,
+        out_of_core=args.out_of_core,
+        matrix_dtype=args.matrix_dtype,
+        csv_options={
+            "float_precision": args.float_precision,
+            "na_rep": args.na_rep,
+            "format_workers": args.format_workers,
+            "compress_workers": args.compress_workers,
+        },
+        pipeline=args.pipeline,
+        incremental=args.incremental,
+        percentiles=args.percentiles,
+        combined=args.combined,
+        fetch_strategy=args.fetch_strategy,
+    )
+    summaries = []
+
+    def report(summary: dict):
+        print(json.dumps(summary), flush=True)
+        summaries.append(summary)
+
+    names = output_names(files)
+    if args.jobs <= 1:
+        for file, name in zip(files, names):
+            report(export_file(file, output_name=name, **export_kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [
+                executor.submit(export_file, file, output_name=name, **export_kwargs)
+                for file, name in zip(files, names)
+            ]
+            for future in as_completed(futures):
+                report(future.result())
+
+    return 1 if any(summary["status"] != "ok" for summary in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
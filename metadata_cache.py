@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from typing import TYPE_CHECKING
+from cache_paths import user_cache_dir
+
+if TYPE_CHECKING:
+    from scils_utils import FeatureList, Region
+
+
+def _json_default(value):
+    # Values read from the SCiLS data frames may be numpy scalars
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class MetadataCache:
+    """
+    Persistent cache of the feature lists and leaf regions of SLX files.
+
+    One small JSON file is kept per SLX path. It records the size and
+    modification time of the file it was built from, so a changed SLX file is
+    detected with a single ``os.stat`` call.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or user_cache_dir("metadata")
+
+    def _entry_path(self, file_path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    @staticmethod
+    def _identity(file_path: str) -> dict:
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _read(self, file_path: str) -> dict | None:
+        try:
+            with open(self._entry_path(file_path)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, file_path: str) -> tuple[list["FeatureList"], list["Region"]] | None:
+        """
+        Return the cached feature lists and regions of ``file_path`` without
+        checking whether the file changed since they were cached.
+        """
+        entry = self._read(file_path)
+        if entry is None:
+            return None
+        from scils_utils import FeatureList, Region
+
+        try:
+            feature_lists = [FeatureList(**item) for item in entry["feature_lists"]]
+            regions = [Region(**item) for item in entry["regions"]]
+        except (KeyError, TypeError):
+            return None
+        return feature_lists, regions
+
+    def is_fresh(self, file_path: str) -> bool:
+        """
+        Whether the cached entry of ``file_path`` matches the file on disk.
+        """
+        entry = self._read(file_path)
+        if entry is None:
+            return False
+        try:
+            return entry.get("identity") == self._identity(file_path)
+        except OSError:
+            return False
+
+    def store(self, file_path: str, feature_lists: list["FeatureList"], regions: list["Region"]):
+        entry = {
+            "file_path": os.path.abspath(file_path),
+            "identity": self._identity(file_path),
+            "feature_lists": [asdict(feature_list) for feature_list in feature_lists],
+            "regions": [asdict(region) for region in regions],
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._entry_path(file_path) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, default=_json_default)
+        os.replace(tmp_path, self._entry_path(file_path))
@@ -0,0 +1,252 @@
+"""
+Export of several feature lists of an SLX file in a single pass.
+
+The features of all lists are merged into one list without duplicates, so
+the spots of every region and the intensities of a feature shared by lists
+are fetched once. The block built for a region is then either written as
+is, to one combined file, or split into the columns of every list and
+written to one file per list.
+"""
+import os
+import re
+from contextlib import ExitStack
+from typing import TYPE_CHECKING
+import numpy as np
+from export_stats import ExportStats
+from export_writers import (
+    LAYOUT_AGGREGATE,
+    LAYOUT_IMAGE,
+    LAYOUT_LONG,
+    LAYOUT_SPARSE,
+    LAYOUT_WIDE,
+    get_writer,
+)
+from region_aggregates import DEFAULT_PERCENTILES, stat_names, validate_percentiles
+from scils_utils import (
+    BASE_COLUMNS,
+    FETCH_PER_REGION,
+    REPORT_SUFFIX,
+    ExportSource,
+    ExportSummary,
+    Feature,
+    FeatureList,
+    Region,
+    SparseBlock,
+    SparseRegionBlock,
+    build_long_frame,
+    get_features,
+    ignore,
+    layout_columns,
+)
+
+if TYPE_CHECKING:
+    from intensity_cache import IntensityCache
+    from spot_prefetch import SpotPrefetcher
+
+
+def union_features(feature_table, feature_lists: list[FeatureList]) -> tuple[list[Feature], list[list[int]]]:
+    """
+    Merge the features of ``feature_lists`` by id, in the order they first
+    appear. Returns the merged features and, per list, the positions of its
+    features among them.
+    """
+    features: list[Feature] = []
+    index: dict[str, int] = {}
+    list_positions = []
+    for feature_list in feature_lists:
+        positions = []
+        for feature in get_features(feature_table, feature_list):
+            if feature.id not in index:
+                index[feature.id] = len(features)
+                features.append(feature)
+            positions.append(index[feature.id])
+        list_positions.append(positions)
+    return features, list_positions
+
+
+def feature_list_paths(output_path: str, feature_lists: list[FeatureList]) -> list[str]:
+    """
+    Output file of every feature list, named after the list beside
+    ``output_path``, e.g. ``export_My_list.csv`` for ``export.csv``.
+    """
+    root, extension = os.path.splitext(output_path)
+    if extension in (".gz", ".zst"):
+        root, inner = os.path.splitext(root)
+        extension = inner + extension
+    names = [re.sub(r"[^\w.-]+", "_", feature_list.name).strip("_") or "list" for feature_list in feature_lists]
+    paths = []
+    for name, feature_list in zip(names, feature_lists):
+        if names.count(name) > 1:
+            name = f"{name}_{feature_list.id}"
+        paths.append(f"{root}_{name}{extension}")
+    return paths
+
+
+def select_features(output, layout: str, positions: list[int], feature_names: list[str], num_stats: int = 0):
+    """
+    Keep the features at ``positions`` of a region output that
+    ``scils_utils.build_region_output`` built for ``feature_names``, in the
+    order of ``positions``. ``num_stats`` is the number of statistics per
+    feature of a ``LAYOUT_AGGREGATE`` row. ``LAYOUT_LONG`` rows name their
+    feature only, so they are selected as a ``LAYOUT_SPARSE`` block, see
+    ``block_layout``.
+    """
+    num_features = len(feature_names)
+    if list(positions) == list(range(num_features)):
+        return output
+    if layout == LAYOUT_WIDE:
+        base = len(BASE_COLUMNS)
+        return output.iloc[:, list(range(base)) + [base + position for position in positions]]
+    if layout == LAYOUT_AGGREGATE:
+        base = output.shape[1] - num_features * num_stats
+        columns = list(range(base))
+        for position in positions:
+            start = base + position * num_stats
+            columns.extend(range(start, start + num_stats))
+        return output.iloc[:, columns]
+
+    if layout != LAYOUT_SPARSE:
+        raise ValueError(f"Cannot select the features of a {layout} output")
+    rank = np.full(num_features, -1, dtype=np.intp)
+    rank[positions] = np.arange(len(positions))
+    block = output.block
+    cols = rank[block.cols]
+    keep = cols >= 0
+    rows, cols, values = block.rows[keep], cols[keep], block.values[keep]
+    order = np.lexsort((cols, rows))
+    return SparseRegionBlock(
+        tissue_id=output.tissue_id,
+        spot_ids=output.spot_ids,
+        x=output.x,
+        y=output.y,
+        block=SparseBlock(rows=rows[order], cols=cols[order], values=values[order]),
+    )
+
+
+def block_layout(layout: str) -> str:
+    """
+    Layout of the region blocks a multi-list export builds for ``layout``.
+    Long rows are built per output from a sparse block, whose columns are
+    the positions of the features, so that features sharing a name stay
+    apart.
+    """
+    return LAYOUT_SPARSE if layout == LAYOUT_LONG else layout
+
+
+def export_feature_lists(
+    slx_filepath: str,
+    output_path: str,
+    region_list: list[Region],
+    feature_lists: list[FeatureList],
+    export_progress: callable = None,
+    combined: bool = False,
+    output_format: str = None,
+    fetch_strategy: str = FETCH_PER_REGION,
+    workers: int = 1,
+    cache: "IntensityCache" = None,
+    log: callable = print,
+    report: bool = False,
+    layout: str = LAYOUT_WIDE,
+    matrix_dtype: str = "float64",
+    csv_options: dict = None,
+    pipeline: bool = True,
+    percentiles: tuple[float, ...] = DEFAULT_PERCENTILES,
+    spot_prefetcher: "SpotPrefetcher" = None,
+) -> dict[str, ExportSummary]:
+    """
+    Export several ``feature_lists`` of ``slx_filepath`` in a single pass
+    over ``region_list``.
+
+    With ``combined`` enabled every feature of the lists is written once to
+    ``output_path``, otherwise each list goes to its own file, see
+    ``feature_list_paths``. Either way the spots of a region and the
+    intensities of every distinct feature are fetched once. The other
+    arguments are those of ``scils_utils.generate_csv``; the image layout,
+    checkpoints, incremental and out-of-core exports are not supported.
+    Returns an ``ExportSummary`` per output file, sharing the discarded
+    regions and the stats of the pass. With ``report`` the stats are written
+    next to every output file.
+    """
+    if not feature_lists:
+        raise ValueError("No feature lists to export")
+    if layout == LAYOUT_IMAGE:
+        raise ValueError(f"The {LAYOUT_IMAGE} layout exports a single feature list")
+    percentiles = validate_percentiles(percentiles)
+
+    discarded_regions = []
+    export_progress = export_progress or ignore
+    stats = ExportStats(len(region_list), log)
+
+    cache_id = "+".join(str(feature_list.id) for feature_list in feature_lists)
+    with ExportSource(slx_filepath, cache_id, cache, spot_prefetcher) as source:
+        features, list_positions = union_features(source.dataset.feature_table, feature_lists)
+        log(
+            f"Exporting {len(feature_lists)} feature lists with {len(features)} distinct features "
+            f"({sum(len(positions) for positions in list_positions)} in total)"
+        )
+
+        feature_names = [feature.name for feature in features]
+        if combined:
+            outputs = [(output_path, list(range(len(features))))]
+        else:
+            outputs = list(zip(feature_list_paths(output_path, feature_lists), list_positions))
+
+        run_export = source.runner(
+            features, BASE_COLUMNS + feature_names, discarded_regions,
+            workers=workers, fetch_strategy=fetch_strategy, log=log, stats=stats,
+            layout=block_layout(layout), pipeline=pipeline, percentiles=percentiles, matrix_dtype=matrix_dtype,
+        )
+        rows = _write_outputs(
+            run_export, region_list, export_progress, outputs, feature_names, output_format, layout,
+            csv_options, percentiles, stats,
+        )
+    source.finish(log)
+    stats.finish()
+    if report:
+        for path, _ in outputs:
+            stats.write_report(path + REPORT_SUFFIX)
+    return {
+        path: ExportSummary(rows=rows[path], discarded_regions=discarded_regions, stats=stats.to_dict())
+        for path, _ in outputs
+    }
+
+
+def _write_outputs(
+    run_export: callable,
+    region_list: list[Region],
+    export_progress: callable,
+    outputs: list[tuple[str, list[int]]],
+    feature_names: list[str],
+    output_format: str,
+    layout: str,
+    csv_options: dict,
+    percentiles,
+    stats: ExportStats,
+) -> dict[str, int]:
+    """
+    Open a writer per (path, feature positions) of ``outputs``, call
+    ``run_export(region_list, export_progress, emit_block)`` and write the
+    features of every output from the region blocks it emits, which are
+    built for ``block_layout(layout)``. Returns the rows written per path.
+    """
+    num_stats = len(stat_names(percentiles))
+    with ExitStack() as stack:
+        writers = []
+        for path, positions in outputs:
+            names = [feature_names[position] for position in positions]
+            columns = layout_columns(names, layout, percentiles)
+            writer = stack.enter_context(get_writer(path, columns, output_format, layout, csv_options))
+            writers.append((writer, positions, BASE_COLUMNS + names))
+
+        def write_block(region, block):
+            for writer, positions, all_columns in writers:
+                part = select_features(block, block_layout(layout), positions, feature_names, num_stats)
+                if layout == LAYOUT_LONG:
+                    part = build_long_frame(region, part.spot_ids, part.x, part.y, part.block, all_columns)
+                with stats.stage("write", spots=len(part)):
+                    writer.write_block(part)
+            stats.bytes_written = sum(writer.bytes_written() for writer, _, _ in writers)
+
+        run_export(region_list, export_progress, write_block)
+    stats.bytes_written = sum(os.path.getsize(writer.path) for writer, _, _ in writers)
+    return {path: writer.rows_written for (path, _), (writer, _, _) in zip(outputs, writers)}
@@ -0,0 +1,127 @@
+import os
+import time
+import numpy as np
+from export_stats import ExportStats
+from scils_utils import (
+    Feature,
+    Region,
+    build_region_frame,
+    build_spot_index,
+    ignore,
+    load_region_spots,
+    map_spots_to_rows,
+)
+
+# Rows read back from the matrix and written per block
+CHUNK_ROWS = 50_000
+
+
+def export_out_of_core(
+    dataset,
+    feature_table,
+    region_list: list[Region],
+    features: list[Feature],
+    all_columns: list[str],
+    writer,
+    export_progress: callable,
+    discarded_regions: list[Region],
+    matrix_path: str,
+    dtype=np.float64,
+    log: callable = print,
+    stats: ExportStats = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> int:
+    """
+    Export the wide layout through a disk-backed (spots x features) matrix.
+
+    The spots of every region are counted first, then a ``np.memmap`` of all
+    spots is preallocated at ``matrix_path`` and filled in place, one feature
+    of one region at a time. The matrix is stored column-major so that every
+    feature is a contiguous write. Finally the matrix is streamed to
+    ``writer`` in blocks of ``chunk_rows`` rows and removed. Memory use
+    depends on ``chunk_rows`` and the size of a single feature column, not on
+    the number of features of a region. Returns the number of rows written.
+    """
+    stats = stats or ExportStats(len(region_list), log=ignore)
+    dtype = np.dtype(dtype)
+
+    region_spots = {}
+    offsets = {}
+    total_spots = 0
+    for region in region_list:
+        with stats.stage("get_region_spots"):
+            spots = load_region_spots(dataset, region)
+        if len(spots[0]) == 0:
+            log(f"Region id:{region.id} and Region name: {region.name} has no valid spots.")
+            discarded_regions.append(region)
+            continue
+        region_spots[region.id] = spots
+        offsets[region.id] = total_spots
+        total_spots += len(spots[0])
+
+    shape = (total_spots, len(features))
+    log(
+        f"Preallocating a {shape[0]} x {shape[1]} {dtype.name} matrix "
+        f"({shape[0] * shape[1] * dtype.itemsize / 1024**3:,.2f} GB) at {matrix_path}"
+    )
+    if shape[0] * shape[1] == 0:
+        # An empty file cannot be mapped
+        matrix = np.empty(shape, dtype=dtype, order="F")
+    else:
+        matrix = np.memmap(matrix_path, dtype=dtype, mode="w+", shape=shape, order="F")
+
+    try:
+        for i, region in enumerate(region_list):
+            if region.id not in region_spots:
+                continue
+            log(f"Filling region {i + 1}/{len(region_list)}: {region.name}")
+            export_progress(i)
+            stats.region_started(region)
+
+            region_spot_ids = region_spots[region.id][0]
+            num_spots = len(region_spot_ids)
+            start = offsets[region.id]
+            spot_index = build_spot_index(region_spot_ids)
+            fetch_seconds = fill_seconds = 0.0
+            for col, feature_row in enumerate(features):
+                fetch_start = time.perf_counter()
+                intensities = feature_table.get_feature_intensities(feature_row.id, region.id)
+                fill_start = time.perf_counter()
+                rows, found = map_spots_to_rows(spot_index, intensities.spot_ids)
+                column = np.full(num_spots, np.nan, dtype=dtype)
+                column[rows] = np.asarray(intensities.values)[found]
+                matrix[start:start + num_spots, col] = column
+                fetch_seconds += fill_start - fetch_start
+                fill_seconds += time.perf_counter() - fill_start
+            stats.add("get_feature_intensities", fetch_seconds, len(features), num_spots)
+            stats.add("fill", fill_seconds, 1, num_spots)
+            stats.region_done(num_spots)
+
+        if isinstance(matrix, np.memmap):
+            matrix.flush()
+
+        for region in region_list:
+            if region.id not in region_spots:
+                continue
+            region_spot_ids, region_spot_x, region_spot_y = region_spots[region.id]
+            start = offsets[region.id]
+            for chunk_start in range(0, len(region_spot_ids), chunk_rows):
+                chunk = slice(chunk_start, chunk_start + chunk_rows)
+                num_rows = len(region_spot_ids[chunk])
+                with stats.stage("write", spots=num_rows):
+                    writer.write_block(build_region_frame(
+                        region,
+                        region_spot_ids[chunk],
+                        region_spot_x[chunk],
+                        region_spot_y[chunk],
+                        np.asarray(matrix[start + chunk_start:start + chunk_start + num_rows]),
+                        all_columns,
+                    ))
+                stats.bytes_written = writer.bytes_written()
+    finally:
+        del matrix
+        if os.path.exists(matrix_path):
+            os.remove(matrix_path)
+
+    export_progress(len(region_list))
+    return writer.rows_written
@@ -5,8 +5,22 @@ from PyQt6.QtWidgets import (
     QWidget,
     QVBoxLayout
 )
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtCore import QTimer
 from PyQt6.QtGui import QTextCursor
+import logging
+import time
+from datetime import datetime
+
+# How often buffered log messages are moved into the log display
+LOG_FLUSH_INTERVAL_MS = 100
+# Lines kept in the log display, the full log is in the log file
+MAX_LOG_BLOCKS = 5000
+LEVEL_ICONS = {
+    logging.INFO: "ℹ️ ",
+    logging.WARNING: "⚠️ ",
+    logging.ERROR: "❌",
+    logging.DEBUG: "🔍",
+}
 
 class OutputWidget(QWidget):
 
@@ -29,6 +43,7 @@ class OutputWidget(QWidget):
         self.log_display = QPlainTextEdit()
         self.log_display.setReadOnly(True)
         self.log_display.setPlaceholderText("Export logs will appear here...")
+        self.log_display.setMaximumBlockCount(MAX_LOG_BLOCKS)
         layout.addWidget(self.log_display)
 
         self.setLayout(layout)
@@ -36,6 +51,23 @@ class OutputWidget(QWidget):
     def update_progress(self, value):
         self.progress_bar.setValue(value)
     
+    def attach_logger(self, logger_service, interval_ms: int = LOG_FLUSH_INTERVAL_MS):
+        """Show the messages of ``logger_service``, flushed in batches on a timer"""
+        self._logger_service = logger_service
+        self._log_timer = QTimer(self)
+        self._log_timer.timeout.connect(self.flush_logs)
+        self._log_timer.start(interval_ms)
+
+    def flush_logs(self):
+        """Append all messages buffered since the last flush at once"""
+        entries, dropped = self._logger_service.drain()
+        lines = []
+        if dropped:
+            lines.append(self._format(logging.WARNING, f"{dropped} messages skipped, see the log file"))
+        lines.extend(self._format(level, message, timestamp) for level, timestamp, message in entries)
+        if lines:
+            self.append_log("\n".join(lines))
+
     def append_log(self, message):
         self.log_display.appendPlainText(message)
         # Auto-scroll to the bottom
@@ -46,31 +78,25 @@ class OutputWidget(QWidget):
         cursor = self.log_display.textCursor()
         cursor.movePosition(QTextCursor.MoveOperation.End)
         self.log_display.setTextCursor(cursor)
+
+    @staticmethod
+    def _format(level, message, timestamp=None):
+        """Prefix a message with its time and level icon"""
+        time_text = datetime.fromtimestamp(timestamp or time.time()).strftime("%H:%M:%S")
+        return f"[{time_text}] {LEVEL_ICONS[level]} {message}"
     
     def append_info(self, message):
         """Append info message with timestamp"""
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] ℹ️  {message}"
-        self.append_log(formatted_message)
+        self.append_log(self._format(logging.INFO, message))
     
     def append_warning(self, message):
         """Append warning message with timestamp"""
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] ⚠️  {message}"
-        self.append_log(formatted_message)
+        self.append_log(self._format(logging.WARNING, message))
     
     def append_error(self, message):
         """Append error message with timestamp"""
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] ❌ {message}"
-        self.append_log(formatted_message)
+        self.append_log(self._format(logging.ERROR, message))
     
     def append_debug(self, message):
         """Append debug message with timestamp"""
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] 🔍 {message}"
-        self.append_log(formatted_message)
\ No newline at end of file
+        self.append_log(self._format(logging.DEBUG, message))
@@ -0,0 +1,163 @@
+import atexit
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from export_stats import ExportStats
+from export_writers import LAYOUT_WIDE
+from session_manager import open_local_session
+from region_aggregates import DEFAULT_PERCENTILES
+from scils_utils import (
+    Feature,
+    Region,
+    build_region_block,
+    build_region_output,
+    ignore,
+    load_region_spots,
+)
+
+# Session of the current worker process, opened once by _init_worker
+_session = None
+
+
+def default_worker_count() -> int:
+    """
+    Number of worker processes used when none is configured.
+    """
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+# Intensity cache of the current worker process and the key of the export
+_cache = None
+_cache_key = None
+
+
+def _init_worker(slx_filepath: str, cache=None, cache_key: str = None):
+    """
+    Open the SLX file once per worker process, it is reused by every region
+    exported in that process.
+    """
+    global _session, _cache, _cache_key
+    _session = open_local_session(slx_filepath)
+    _cache, _cache_key = cache, cache_key
+    atexit.register(_session.close)
+
+
+def _export_region(
+    region: Region,
+    features: list[Feature],
+    layout: str = LAYOUT_WIDE,
+    percentiles=DEFAULT_PERCENTILES,
+    value_dtype=np.float64,
+) -> tuple[tuple[np.ndarray, np.ndarray, np.ndarray, object] | None, dict]:
+    """
+    Export a single region in a worker process.
+
+    Returns the compact numpy arrays (spot ids, x, y and the feature block of
+    ``layout``) of the region, or None when the region has no spots, together
+    with the stage timings measured in the worker.
+    """
+    stats = ExportStats(1, log=ignore)
+    dataset = _session.dataset_proxy
+    if _cache is not None:
+        dataset = _cache.wrap(dataset, _cache_key)
+    feature_table = dataset.feature_table
+
+    with stats.stage("get_region_spots"):
+        region_spot_ids, region_spot_x, region_spot_y = load_region_spots(dataset, region)
+    if len(region_spot_ids) == 0:
+        return None, stats.stages
+
+    num_spots = len(region_spot_ids)
+    with stats.stage("get_feature_intensities", calls=len(features), spots=num_spots):
+        feature_intensities = [
+            feature_table.get_feature_intensities(feature_row.id, region.id)
+            for feature_row in features
+        ]
+    with stats.stage("fill", spots=num_spots):
+        feature_block = build_region_block(
+            region_spot_ids, feature_intensities, layout, percentiles, value_dtype
+        )
+    return (region_spot_ids, region_spot_x, region_spot_y, feature_block), stats.stages
+
+
+def export_regions_parallel(
+    slx_filepath: str,
+    region_list: list[Region],
+    features: list[Feature],
+    all_columns: list[str],
+    export_progress: callable,
+    discarded_regions: list[Region],
+    emit_block: callable,
+    workers: int = None,
+    cache=None,
+    cache_key: str = None,
+    log: callable = print,
+    stats: ExportStats = None,
+    layout: str = LAYOUT_WIDE,
+    percentiles=DEFAULT_PERCENTILES,
+    value_dtype=np.float64,
+):
+    """
+    Export the regions of ``region_list`` with a pool of worker processes.
+
+    Regions are handed out one at a time and their blocks are passed to
+    ``emit_block(region, frame)`` in the original region order, so the output is identical to a sequential
+    export. At most two regions per worker are in flight or waiting to be
+    written, which bounds the memory held by out-of-order results.
+    ``export_progress`` receives the number of finished regions. The worker
+    processes share the on-disk ``cache`` when one is given.
+    """
+    workers = workers or default_worker_count()
+    stats = stats or ExportStats(len(region_list), log=ignore)
+    max_pending = 2 * workers
+
+    pending = {}
+    finished = {}
+    next_to_submit = 0
+    next_to_write = 0
+    completed = 0
+
+    log(f"Exporting {len(region_list)} regions with {workers} worker processes")
+    export_progress(0)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(slx_filepath, cache, cache_key)
+    ) as executor:
+        while next_to_write < len(region_list):
+            while (
+                next_to_submit < len(region_list)
+                and next_to_submit - next_to_write < max_pending
+            ):
+                future = executor.submit(
+                    _export_region, region_list[next_to_submit], features, layout, percentiles, value_dtype
+                )
+                pending[future] = next_to_submit
+                next_to_submit += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+                completed += 1
+                export_progress(completed)
+
+            # Write the finished regions that are next in order
+            while next_to_write in finished:
+                region = region_list[next_to_write]
+                result, worker_stages = finished.pop(next_to_write)
+                next_to_write += 1
+                log(
+                    f"Processed region {next_to_write}/{len(region_list)}: {region.name}"
+                )
+                stats.region_started(region)
+                stats.merge(worker_stages)
+
+                if result is None:
+                    log(f"Region id:{region.id} and Region name: {region.name} has no valid spots.")
+                    discarded_regions.append(region)
+                    stats.region_done()
+                    continue
+
+                with stats.stage("dataframe", spots=len(result[0])):
+                    intermediate_df = build_region_output(region, *result, all_columns, layout)
+                emit_block(region, intermediate_df)
+                stats.region_done(len(result[0]))
@@ -0,0 +1,143 @@
+import queue
+import threading
+from export_stats import ExportStats
+from scils_utils import Region, ignore
+
+# Regions buffered between two stages, bounds the memory held by the pipeline
+DEFAULT_QUEUE_DEPTH = 2
+
+# Marks the end of the regions in a queue
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(target: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Put ``item`` into ``target``, waiting for space unless the pipeline is
+    stopped. Returns False when it was stopped.
+    """
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get_all(source: queue.Queue, stop: threading.Event):
+    """
+    Yield the items of ``source`` up to ``_DONE``, or until the pipeline is
+    stopped.
+    """
+    while not stop.is_set():
+        try:
+            item = source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+def _run_stage(source, target: queue.Queue, work: callable, stop: threading.Event):
+    """
+    Apply ``work`` to every item of ``source`` (an iterable, or a queue
+    ending in ``_DONE``) and put the results into ``target``.
+    """
+    try:
+        if isinstance(source, queue.Queue):
+            source = _get_all(source, stop)
+        for item in source:
+            if isinstance(item, _StageError):
+                _put(target, item, stop)
+                return
+            if not _put(target, work(*item), stop):
+                return
+    except BaseException as e:
+        _put(target, _StageError(e), stop)
+        return
+    _put(target, _DONE, stop)
+
+
+def export_regions_pipelined(
+    region_list: list[Region],
+    fetch: callable,
+    assemble: callable,
+    export_progress: callable,
+    discarded_regions: list[Region],
+    emit_block: callable,
+    log: callable = print,
+    stats: ExportStats = None,
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+):
+    """
+    Export the regions of ``region_list`` in three overlapping stages.
+
+    A fetch thread calls ``fetch(region, stats)`` for one region after the
+    other, so the SCiLS backend is kept busy, an assemble thread builds the
+    blocks with ``assemble(region, spots, feature_intensities, stats)`` and
+    the calling thread hands them to ``emit_block(region, frame)`` in region
+    order. The stages are connected by queues of ``queue_depth`` regions;
+    a full queue blocks the stage before it, which caps the memory held by
+    the pipeline. Stage timings are measured per region and merged into
+    ``stats`` by the calling thread. An error in any stage stops the pipeline
+    and is raised here.
+    """
+    stats = stats or ExportStats(len(region_list), log=ignore)
+    fetched = queue.Queue(maxsize=queue_depth)
+    assembled = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+
+    def fetch_region(i, region):
+        region_stats = ExportStats(1, log=ignore)
+        spots, feature_intensities = fetch(region, region_stats)
+        return i, region, spots, feature_intensities, region_stats
+
+    def assemble_region(i, region, spots, feature_intensities, region_stats):
+        block = None
+        if feature_intensities is not None:
+            block = assemble(region, spots, feature_intensities, region_stats)
+        return i, region, len(spots[0]), block, region_stats.stages
+
+    threads = [
+        threading.Thread(
+            target=_run_stage,
+            args=(enumerate(region_list), fetched, fetch_region, stop),
+            name="export-fetch",
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_run_stage,
+            args=(fetched, assembled, assemble_region, stop),
+            name="export-assemble",
+            daemon=True,
+        ),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in _get_all(assembled, stop):
+            if isinstance(item, _StageError):
+                raise item.error
+            i, region, num_spots, block, region_stages = item
+            log(f"Processing region {i + 1}/{len(region_list)}: {region.name}")
+            export_progress(i)
+            stats.region_started(region)
+            stats.merge(region_stages)
+            if block is None:
+                log(f"Region id:{region.id} and Region name: {region.name} has no valid spots.")
+                discarded_regions.append(region)
+                stats.region_done()
+                continue
+            emit_block(region, block)
+            stats.region_done(num_spots)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
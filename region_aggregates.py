@@ -0,0 +1,93 @@
+"""
+Summary statistics of the feature intensities of a region.
+
+The statistics of all features are computed at once from the non-missing
+(feature, value) entries of a region with grouped numpy reductions, the
+(spots x features) block of the region is never built.
+"""
+from dataclasses import dataclass
+import numpy as np
+
+# Statistics computed for every feature, followed by the percentiles
+AGGREGATE_STATS = ("count", "mean", "std", "min", "max", "median")
+DEFAULT_PERCENTILES = (25.0, 75.0)
+
+# Columns of a LAYOUT_AGGREGATE export before the (feature, statistic) columns
+AGGREGATE_BASE_COLUMNS = ["region_id", "tissue_id", "spot_count"]
+
+
+@dataclass
+class AggregateBlock:
+    """
+    Statistics of a region, ``values`` holds one row per feature and one
+    column per entry of ``stat_names``.
+    """
+    stat_names: list[str]
+    values: np.ndarray
+
+
+def stat_names(percentiles=DEFAULT_PERCENTILES) -> list[str]:
+    """
+    Names of the statistics, percentiles are named like ``"p25"``.
+    """
+    return list(AGGREGATE_STATS) + [f"p{float(q):g}" for q in percentiles]
+
+
+def aggregate_columns(feature_names: list[str], percentiles=DEFAULT_PERCENTILES) -> list[str]:
+    """
+    Columns of a LAYOUT_AGGREGATE export, one per (feature, statistic) pair
+    named like ``"<feature> mean"``.
+    """
+    names = stat_names(percentiles)
+    return AGGREGATE_BASE_COLUMNS + [f"{feature} {stat}" for feature in feature_names for stat in names]
+
+
+def validate_percentiles(percentiles) -> tuple[float, ...]:
+    percentiles = tuple(float(q) for q in percentiles)
+    if any(not 0 <= q <= 100 for q in percentiles):
+        raise ValueError(f"Percentiles must be between 0 and 100, got {list(percentiles)}")
+    return percentiles
+
+
+def aggregate_entries(
+    cols: np.ndarray, values: np.ndarray, num_features: int, percentiles=DEFAULT_PERCENTILES
+) -> AggregateBlock:
+    """
+    Compute the statistics of every feature from the entries of a region,
+    ``cols`` giving the feature of each value. Missing (NaN) values are
+    ignored. ``std`` is the sample standard deviation, the median and the
+    percentiles are linearly interpolated like ``np.percentile``. All
+    statistics but ``count`` are NaN for a feature without values.
+    """
+    cols = np.asarray(cols, dtype=np.intp)
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    cols, values = cols[present], values[present]
+
+    # Sort by feature, then value: every feature is a contiguous sorted run
+    order = np.lexsort((values, cols))
+    cols, values = cols[order], values[order]
+    counts = np.bincount(cols, minlength=num_features)
+    starts = np.cumsum(counts) - counts
+
+    names = stat_names(percentiles)
+    result = np.full((num_features, len(names)), np.nan)
+    result[:, 0] = counts
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(cols, weights=values, minlength=num_features) / counts
+        squared = np.bincount(cols, weights=(values - mean[cols]) ** 2, minlength=num_features)
+        std = np.sqrt(squared / (counts - 1))
+
+    has_values = counts > 0
+    first = starts[has_values]
+    result[has_values, 1] = mean[has_values]
+    result[has_values, 2] = std[has_values]
+    result[has_values, 3] = values[first]
+    result[has_values, 4] = values[first + counts[has_values] - 1]
+    for j, q in enumerate((50.0,) + tuple(percentiles)):
+        position = (counts[has_values] - 1) * (q / 100)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.ceil(position).astype(np.intp)
+        low, high = values[first + lower], values[first + upper]
+        result[has_values, 5 + j] = low + (high - low) * (position - lower)
+    return AggregateBlock(stat_names=names, values=result)
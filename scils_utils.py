@@ -1,8 +1,33 @@
-from scilslab import LocalSession
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import os
 import pandas as pd
 import numpy as np
-from logger_service import logger
+from export_writers import (
+    LAYOUT_AGGREGATE,
+    LAYOUT_IMAGE,
+    LAYOUT_LONG,
+    LAYOUT_SPARSE,
+    LAYOUT_WIDE,
+    check_output,
+    get_writer,
+)
+from region_aggregates import (
+    DEFAULT_PERCENTILES,
+    AggregateBlock,
+    aggregate_columns,
+    aggregate_entries,
+    validate_percentiles,
+)
+from session_manager import session_manager
+from export_stats import ExportStats
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # scilslab is only needed once a session is opened, see session_manager
+    from scilslab import LocalSession
+    from intensity_cache import IntensityCache
+    from checkpoint import ExportCheckpoint
+    from spot_prefetch import SpotPrefetcher
 
 
 @dataclass
@@ -23,6 +48,72 @@ class Feature:
     id: str
 
 
+@dataclass
+class ExportSummary:
+    rows: int
+    discarded_regions: list[Region]
+    stats: dict = field(default_factory=dict)
+
+
+@dataclass
+class FeatureIntensities:
+    spot_ids: np.ndarray
+    values: np.ndarray
+
+
+@dataclass
+class SparseBlock:
+    """
+    Non-missing intensities of a region in coordinate form, ``rows`` index
+    the spots of the region and ``cols`` the features, sorted by row.
+    """
+    rows: np.ndarray
+    cols: np.ndarray
+    values: np.ndarray
+
+
+@dataclass
+class SparseRegionBlock:
+    """
+    Block handed to the writer of a ``LAYOUT_SPARSE`` export.
+    """
+    tissue_id: str
+    spot_ids: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    block: SparseBlock
+
+    def __len__(self):
+        return len(self.spot_ids)
+
+
+# Suffix of the JSON timing report written next to the output
+REPORT_SUFFIX = ".report.json"
+
+# Leading columns of every export, followed by one column per feature
+BASE_COLUMNS = ["spotId", "x", "y", "tissue_id"]
+
+# Columns of a LAYOUT_LONG export, one row per non-missing intensity
+LONG_COLUMNS = BASE_COLUMNS + ["feature", "value"]
+
+# Integer types spot ids and spot coordinates are narrowed to, the first one
+# holding all values of a region is used
+SPOT_ID_DTYPES = (np.int32,)
+COORDINATE_DTYPES = (np.int16, np.int32)
+
+# Strategies for fetching feature intensities in generate_csv
+FETCH_PER_REGION = "per_region"
+FETCH_BULK = "bulk"
+FETCH_AUTO = "auto"
+
+# Minimum share of the dataset spots the selected regions must cover for
+# FETCH_AUTO to fetch each feature once for the whole dataset
+BULK_FETCH_MIN_COVERAGE = 0.5
+# Largest estimated size of the partitioned intensities a bulk fetch holds
+# until their regions are written, above it FETCH_AUTO fetches per region
+BULK_FETCH_MAX_BYTES = 64 * 1024**2
+
+
 def region_dfs(rt, region_list):
     if rt.subregions == []:
         # region_table.loc[len(region_table)] = [rt.id, rt.name.split('/')[-1]]
@@ -32,7 +123,7 @@ def region_dfs(rt, region_list):
             region_dfs(subregion, region_list)
 
 
-def get_feature_lists(session: LocalSession, file_path: str) -> list[FeatureList]:
+def get_feature_lists(session: "LocalSession", file_path: str) -> list[FeatureList]:
     """
     Get a list of feature lists from the specified SLX file.
     """
@@ -52,7 +143,7 @@ def get_feature_lists(session: LocalSession, file_path: str) -> list[FeatureList
     return feature_lists
 
 
-def get_region_list(session: LocalSession, file_path: str) -> list[Region]:
+def get_region_list(session: "LocalSession", file_path: str) -> list[Region]:
     """
     Get a list of regions from the specified SLX file.
     """
@@ -66,83 +157,933 @@ def get_features_from_feature_list(file_path: str, feature_list_id: str) -> list
     pass
 
 
+def compact_ints(values, dtypes=COORDINATE_DTYPES) -> np.ndarray:
+    """
+    Narrow an integer array to the first of ``dtypes`` that holds all of its
+    values. Other arrays, and arrays already as narrow, are returned as is.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind not in "iu" or len(values) == 0:
+        return values
+    low, high = values.min(), values.max()
+    for dtype in dtypes:
+        info = np.iinfo(dtype)
+        if info.bits >= values.dtype.itemsize * 8:
+            break
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def tissue_column(region: Region, length: int) -> pd.Categorical:
+    """
+    The ``tissue_id`` of ``length`` rows of ``region``, dictionary-encoded
+    so that the name is stored once instead of once per row.
+    """
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[region.name.split("/")[-1]])
+
+
+def build_spot_index(spot_ids) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build a sorted lookup index for the spot ids of a region.
+
+    Returns the argsort order and the sorted spot ids, so that row positions
+    can be resolved with ``np.searchsorted`` instead of a per-spot dict lookup.
+    """
+    spot_ids = np.asarray(spot_ids)
+    order = np.argsort(spot_ids, kind="stable")
+    sorted_ids = spot_ids[order]
+    if sorted_ids.dtype.kind in "iu":
+        # Compact spot ids are widened once here, a narrower index would be
+        # converted by every searchsorted against the fetched spot ids
+        sorted_ids = sorted_ids.astype(np.int64, copy=False)
+    return order, sorted_ids
+
+
+def map_spots_to_rows(spot_index: tuple[np.ndarray, np.ndarray], spot_ids) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Map spot ids onto row positions of the region described by ``spot_index``.
+
+    Returns the row positions of the matched spots and a boolean mask telling
+    which of the given spot ids belong to the region.
+    """
+    order, sorted_ids = spot_index
+    spot_ids = np.asarray(spot_ids)
+    if len(sorted_ids) == 0 or len(spot_ids) == 0:
+        return np.empty(0, dtype=np.intp), np.zeros(len(spot_ids), dtype=bool)
+
+    pos = np.searchsorted(sorted_ids, spot_ids)
+    pos[pos == len(sorted_ids)] = 0
+    found = sorted_ids[pos] == spot_ids
+    return order[pos[found]], found
+
+
+def gather_feature_entries(spot_index, feature_intensities) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Collect the intensities of each feature as (row, column, value) arrays.
+
+    ``feature_intensities`` is a sequence of objects exposing ``spot_ids`` and
+    ``values`` as returned by ``get_feature_intensities``, one per column.
+    Spots that are not part of the region described by ``spot_index`` are
+    ignored.
+    """
+    rows, cols, vals = [], [], []
+    for col, intensities in enumerate(feature_intensities):
+        feature_rows, found = map_spots_to_rows(spot_index, intensities.spot_ids)
+        rows.append(feature_rows)
+        cols.append(np.full(len(feature_rows), col, dtype=np.intp))
+        vals.append(np.asarray(intensities.values)[found])
+
+    if not rows:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def scatter_feature_block(spot_index, feature_intensities, block: np.ndarray) -> np.ndarray:
+    """
+    Fill ``block`` (spots x features) with the intensities of each feature,
+    one per column of the block. Missing spots keep the value already present
+    in the block.
+    """
+    # One column at a time, gathering the entries of all features first
+    # would hold several times the block in index and value temporaries
+    for col, intensities in enumerate(feature_intensities):
+        rows, found = map_spots_to_rows(spot_index, intensities.spot_ids)
+        block[rows, col] = np.asarray(intensities.values)[found]
+    return block
+
+
 def generate_csv(
     slx_filepath: str,
     csv_filepath: str,
     region_list: list[Region],
     feature_list: FeatureList,
-    export_progress: callable
-):
+    export_progress: callable = None,
+    streaming: bool = True,
+    output_format: str = None,
+    fetch_strategy: str = FETCH_PER_REGION,
+    workers: int = 1,
+    cache: "IntensityCache" = None,
+    log: callable = print,
+    checkpoint: bool = False,
+    report: bool = False,
+    layout: str = LAYOUT_WIDE,
+    out_of_core: bool = False,
+    matrix_dtype: str = "float64",
+    csv_options: dict = None,
+    pipeline: bool = True,
+    incremental: bool = False,
+    percentiles: tuple[float, ...] = DEFAULT_PERCENTILES,
+    spot_prefetcher: "SpotPrefetcher" = None,
+) -> "ExportSummary":
+    """
+    Export the pixel-by-pixel intensities of ``feature_list`` for every region
+    in ``region_list`` to ``csv_filepath``.
+
+    The output format is picked from the extension of ``csv_filepath`` (CSV,
+    Parquet, Feather or a NPY bundle, see ``export_writers``) unless
+    ``output_format`` is given.
+
+    With ``streaming`` enabled the header is written once and each region is
+    appended to the file as soon as its block is built, so peak memory depends
+    on the largest region instead of the whole export. With ``streaming``
+    disabled all regions are concatenated in memory and written at the end.
+
+    ``fetch_strategy`` selects how intensities are pulled from SCiLS:
+    ``FETCH_PER_REGION`` (the default, memory follows the largest region)
+    issues one call per (region, feature) pair, ``FETCH_BULK`` one call per
+    feature for the whole dataset, partitioned into the regions afterwards
+    (this keeps the intensities of all regions in memory until they are
+    written), and ``FETCH_AUTO`` picks bulk fetching when the selected
+    regions cover at least ``BULK_FETCH_MIN_COVERAGE`` of the spots and
+    their intensities are estimated to stay below ``BULK_FETCH_MAX_BYTES``.
+
+    With ``workers`` above one the regions are exported by a process pool,
+    see ``parallel_export``. Each worker process opens its own session on the
+    SLX file and always fetches per region.
+
+    With a ``cache`` (see ``intensity_cache``) region spots and intensities
+    are read from disk when a previous export of the same SLX file and feature
+    list already fetched them, and stored there otherwise. Region spots that
+    a ``spot_prefetcher`` (see ``spot_prefetch``) loaded in the background
+    are taken from memory first, a running prefetch is stopped when the
+    export starts. Worker processes of a parallel export load their own.
+
+    Progress (the number of finished regions) and log messages are reported
+    through the plain ``export_progress`` and ``log`` callbacks, so the export
+    does not depend on Qt. Returns an ``ExportSummary``.
+
+    With ``checkpoint`` enabled finished regions are staged next to the
+    output (see ``checkpoint``), a restarted export of the same SLX file,
+    feature list and regions skips them and the output is only assembled, and
+    moved into place, once every region is done.
+
+    Wall time, call counts and throughput of every stage are collected (see
+    ``export_stats``), a live summary with ETA is logged while exporting and
+    ``ExportSummary.stats`` holds the final numbers. With ``report`` enabled
+    they are also written as JSON next to the output.
+
+    ``layout`` selects the shape of the output: ``LAYOUT_WIDE`` writes one
+    row per spot and one column per feature, ``LAYOUT_LONG`` one row per
+    non-missing intensity with the ``LONG_COLUMNS`` and ``LAYOUT_SPARSE`` a
+    sparse spots x features matrix (``.npz``, see ``SparseMatrixWriter``).
+    ``LAYOUT_AGGREGATE`` writes one row per region with the count, mean,
+    std, min, max, median and ``percentiles`` of every feature (see
+    ``region_aggregates``). All but the wide layout are built from the
+    fetched intensities directly, without a dense block. ``LAYOUT_IMAGE``
+    rasterizes the intensities onto the x/y spot grid as a height x width x
+    features ``.npy`` cube with a plane of region indices (see ``image_cube``), it
+    runs sequentially and fetches per region. Checkpointing requires
+    ``LAYOUT_WIDE``.
+
+    With ``out_of_core`` enabled the intensities of all regions are filled
+    into a disk-backed matrix of ``matrix_dtype`` (``"float32"`` halves its
+    size) next to the output and streamed to the output in row chunks, see
+    ``out_of_core``. It runs sequentially, fetches per region and requires
+    ``LAYOUT_WIDE`` without a checkpoint.
+
+    Blocks are held in a compact form: spot ids as int32 and coordinates as
+    the narrowest integer type that fits (see ``compact_ints``), and
+    ``tissue_id`` dictionary-encoded. Intensities are held as
+    ``matrix_dtype``, this applies to the region blocks, the out-of-core
+    matrix and the ``LAYOUT_IMAGE`` cube alike.
+
+    ``csv_options`` configure the CSV writer (``float_precision``, ``na_rep``
+    and ``format_workers`` processes formatting the text in parallel, see
+    ``export_writers.CsvWriter``), other formats ignore them.
+
+    With ``pipeline`` enabled a sequential export fetches the next regions
+    from SCiLS while the previous ones are assembled and written, see
+    ``pipeline_export``. Disabling it runs every step of a region one after
+    another on the calling thread.
+
+    With ``incremental`` enabled the block of every region is kept beside
+    the output together with a manifest of the spots of each region (see
+    ``incremental_export``). A later export of the same feature list only
+    recomputes new or changed regions and merges them with the stored
+    blocks. It implies ``checkpoint``.
+    """
+    checkpoint = checkpoint or incremental
+    if checkpoint and layout != LAYOUT_WIDE:
+        raise ValueError(f"Checkpointed and incremental exports only support the {LAYOUT_WIDE} layout")
+    if out_of_core and (checkpoint or layout != LAYOUT_WIDE):
+        raise ValueError(
+            f"Out-of-core exports only support the {LAYOUT_WIDE} layout without checkpoint or incremental"
+        )
+    check_output(csv_filepath, layout, output_format)
+    if layout == LAYOUT_SPARSE:
+        # The matrix writer collects the blocks until it is closed anyway
+        streaming = True
+    percentiles = validate_percentiles(percentiles)
+
     discarded_regions = []
-    all_region_data = []
+    export_progress = export_progress or ignore
+    stats = ExportStats(len(region_list), log)
 
-    with LocalSession(slx_filepath) as session:
-        dataset = session.dataset_proxy
+    # The session is shared with the feature loader and later exports of the
+    # same file, see session_manager
+    with ExportSource(slx_filepath, feature_list.id, cache, spot_prefetcher) as source:
+        dataset = source.dataset
         feature_table = dataset.feature_table
-        
-        feature_df = feature_table.get_features(feature_list.id)
-
-        features: list[Feature] = []
-        for row in feature_df.iterrows():
-            features.append(Feature(name=row[1]['name'], id=row[1]['id']))
+        features = get_features(feature_table, feature_list)
 
         # Pre-determine all feature names for consistent column structure
         feature_names = [feature.name for feature in features]
-        base_columns = ["spotId", "x", "y", "tissue_id"]
-        all_columns = base_columns + feature_names
+        all_columns = BASE_COLUMNS + feature_names
+        output_columns = layout_columns(feature_names, layout, percentiles)
 
-        for i, region in enumerate(region_list):
-            logger.info_message.emit(f"Processing region {i + 1}/{len(region_list)}: {region.name}")
-            export_progress.emit(i)
-            
-            region_spots = dataset.get_region_spots(region.id)
-
-            # Convert to numpy arrays to ensure consistent data types
-            region_spot_ids = np.array(region_spots.get("spot_id"))
-            region_spot_x = np.array(region_spots.get("x"))
-            region_spot_y = np.array(region_spots.get("y"))
-
-            if len(region_spot_ids) == 0:
-                print(f"Region id:{region.id} and Region name: {region.name} has no valid spots.")
-                discarded_regions.append(region)
-                continue
+        export_checkpoint = None
+        region_spots = {}
+        if incremental:
+            from incremental_export import IncrementalExport, region_fingerprint
 
-            # Pre-allocate data dictionary with all columns
-            region_data = {
-                "spotId": region_spot_ids,
-                "x": region_spot_x,
-                "y": region_spot_y,
-                "tissue_id": [region.name.split("/")[-1]] * len(region_spot_ids)
+            fingerprints = {}
+            for region in region_list:
+                with stats.stage("get_region_spots"):
+                    region_spots[region.id] = load_region_spots(dataset, region)
+                fingerprints[str(region.id)] = region_fingerprint(region_spots[region.id][0])
+            export_checkpoint = IncrementalExport(
+                csv_filepath, slx_filepath, feature_list.id, region_list, all_columns, fingerprints
+            )
+            export_checkpoint.open(log)
+            # The spots of the regions to export again are not fetched twice,
+            # the worker processes of a parallel export fetch their own
+            region_spots = {
+                region_id: spots for region_id, spots in region_spots.items()
+                if workers <= 1 and str(region_id) not in export_checkpoint.completed
             }
-            
-            # Initialize all feature columns with NaN
-            for feature_name in feature_names:
-                region_data[feature_name] = np.full(len(region_spot_ids), np.nan)
-
-            # Create spot_id to index mapping for fast lookups
-            spot_id_to_idx = {spot_id: idx for idx, spot_id in enumerate(region_spot_ids)}
-
-            # Fill feature intensities efficiently
-            for feature_row in features:
-                feature_intensities = feature_table.get_feature_intensities(
-                    feature_row.id, region.id
+        elif checkpoint:
+            from checkpoint import ExportCheckpoint
+
+            export_checkpoint = ExportCheckpoint(
+                csv_filepath, slx_filepath, feature_list.id, region_list, all_columns
+            )
+            export_checkpoint.open(log)
+
+        if layout == LAYOUT_IMAGE:
+            from image_cube import export_image_cube
+
+            rows = export_image_cube(
+                dataset, feature_table, region_list, features, csv_filepath,
+                export_progress, discarded_regions, matrix_dtype, log, stats,
+            )
+        elif out_of_core:
+            from out_of_core import export_out_of_core
+
+            with get_writer(csv_filepath, all_columns, output_format, csv_options=csv_options) as writer:
+                rows = export_out_of_core(
+                    dataset, feature_table, region_list, features, all_columns, writer,
+                    export_progress, discarded_regions, csv_filepath + ".matrix.tmp",
+                    matrix_dtype, log, stats,
+                )
+            stats.bytes_written = os.path.getsize(writer.path)
+        else:
+            run_export = source.runner(
+                features, all_columns, discarded_regions,
+                workers=workers, fetch_strategy=fetch_strategy, log=log, stats=stats, layout=layout,
+                pipeline=pipeline, percentiles=percentiles, matrix_dtype=matrix_dtype,
+                region_spots=region_spots,
+            )
+            rows = _write_export(
+                run_export, csv_filepath, region_list, output_columns, export_progress,
+                output_format, streaming, export_checkpoint, stats, layout, csv_options,
+            )
+    source.finish(log)
+    return _finish_export(rows, discarded_regions, stats, csv_filepath, report)
+
+
+def layout_columns(feature_names: list[str], layout: str = LAYOUT_WIDE, percentiles=DEFAULT_PERCENTILES) -> list[str]:
+    """
+    Columns the writer of ``layout`` is opened with for ``feature_names``.
+    """
+    if layout == LAYOUT_LONG:
+        return LONG_COLUMNS
+    if layout == LAYOUT_SPARSE:
+        return feature_names
+    if layout == LAYOUT_AGGREGATE:
+        return aggregate_columns(feature_names, percentiles)
+    return BASE_COLUMNS + feature_names
+
+
+def _finish_export(
+    rows: int,
+    discarded_regions: list[Region],
+    stats: ExportStats,
+    csv_filepath: str,
+    report: bool,
+) -> ExportSummary:
+    stats.finish()
+    if report:
+        stats.write_report(csv_filepath + REPORT_SUFFIX)
+    return ExportSummary(rows=rows, discarded_regions=discarded_regions, stats=stats.to_dict())
+
+
+class ExportSource:
+    """
+    The dataset an export reads from: the shared session of ``slx_filepath``
+    (see ``session_manager``), served from the intensity ``cache`` under the
+    key of ``cache_id`` and from the ``spot_prefetcher`` when given. Used as
+    a context manager that holds the session, ``runner`` then exports
+    regions from it on the calling thread or in worker processes and
+    ``finish`` logs the cache hits and evicts the cache.
+    """
+
+    def __init__(
+        self,
+        slx_filepath: str,
+        cache_id: str,
+        cache: "IntensityCache" = None,
+        spot_prefetcher: "SpotPrefetcher" = None,
+    ):
+        self.slx_filepath = slx_filepath
+        self.cache = cache
+        self.spot_prefetcher = spot_prefetcher
+        self.cache_key = None
+        if cache is not None:
+            self.cache_key = cache.key_for(slx_filepath, cache_id)
+            cache.reset_stats()
+        self._acquired = False
+
+    def __enter__(self) -> "ExportSource":
+        dataset = session_manager.acquire(self.slx_filepath).dataset_proxy
+        self._acquired = True
+        if self.cache is not None:
+            dataset = self.cache.wrap(dataset, self.cache_key)
+        if self.spot_prefetcher is not None:
+            dataset = self.spot_prefetcher.wrap(dataset, self.slx_filepath)
+        self.dataset = dataset
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the session, it is kept open for later exports of the file.
+        """
+        if self._acquired:
+            self._acquired = False
+            session_manager.release(self.slx_filepath)
+
+    def runner(
+        self,
+        features: list[Feature],
+        all_columns: list[str],
+        discarded_regions: list[Region],
+        workers: int = 1,
+        fetch_strategy: str = FETCH_PER_REGION,
+        log: callable = print,
+        stats: ExportStats = None,
+        layout: str = LAYOUT_WIDE,
+        pipeline: bool = True,
+        percentiles=DEFAULT_PERCENTILES,
+        matrix_dtype: str = "float64",
+        region_spots: dict[str, tuple] = None,
+    ) -> callable:
+        """
+        Return ``run_export(regions, progress, emit_block)``, which builds
+        the block of every region with ``_export_regions`` or, with
+        ``workers`` above one, ``parallel_export``.
+        """
+        if workers <= 1:
+            dataset = self.dataset
+
+            def run_export(regions, progress, emit_block):
+                _export_regions(
+                    dataset, dataset.feature_table, regions, features, all_columns,
+                    progress, discarded_regions, emit_block,
+                    fetch_strategy=fetch_strategy, log=log, stats=stats, layout=layout, pipeline=pipeline,
+                    percentiles=percentiles, value_dtype=matrix_dtype, region_spots=region_spots,
                 )
-                
-                # Use vectorized operations instead of loops
-                for spot_id, intensity in zip(feature_intensities.spot_ids, feature_intensities.values):
-                    if spot_id in spot_id_to_idx:
-                        idx = spot_id_to_idx[spot_id]
-                        region_data[feature_row.name][idx] = intensity
-
-            # Create DataFrame from complete data dictionary
-            intermediate_df = pd.DataFrame(region_data, columns=all_columns)
-            all_region_data.append(intermediate_df)
-
-        # Concatenate all regions at once instead of incrementally
-        if all_region_data:
-            overall_df = pd.concat(all_region_data, ignore_index=True)
-            overall_df.to_csv(csv_filepath, index=False)
+            return run_export
+
+        def run_export(regions, progress, emit_block):
+            from parallel_export import export_regions_parallel
+
+            # The worker processes open their own sessions, the one used to
+            # read the feature list is closed first
+            self.close()
+            session_manager.close_idle(self.slx_filepath)
+            export_regions_parallel(
+                self.slx_filepath, regions, features, all_columns,
+                progress, discarded_regions, emit_block,
+                workers=workers, cache=self.cache, cache_key=self.cache_key, log=log, stats=stats,
+                layout=layout, percentiles=percentiles, value_dtype=matrix_dtype,
+            )
+        return run_export
+
+    def finish(self, log: callable = print):
+        # Worker processes keep their own counts, nothing is logged for them
+        if self.cache is not None:
+            if self.cache.hits or self.cache.misses:
+                log(f"Intensity cache: {self.cache.hits} hits, {self.cache.misses} misses")
+            self.cache.evict()
+        if self.spot_prefetcher is not None and (self.spot_prefetcher.hits or self.spot_prefetcher.misses):
+            log(f"Prefetched spots: {self.spot_prefetcher.hits} hits, {self.spot_prefetcher.misses} misses")
+
+
+def _write_export(
+    run_export: callable,
+    csv_filepath: str,
+    region_list: list[Region],
+    all_columns: list[str],
+    export_progress: callable,
+    output_format: str = None,
+    streaming: bool = True,
+    export_checkpoint: "ExportCheckpoint" = None,
+    stats: ExportStats = None,
+    layout: str = LAYOUT_WIDE,
+    csv_options: dict = None,
+) -> int:
+    """
+    Call ``run_export(regions, progress, emit_block)`` and route the region
+    blocks it emits to the output. Returns the number of rows written.
+    """
+    stats = stats or ExportStats(len(region_list), log=ignore)
+
+    if export_checkpoint is not None:
+        # Only export the regions a previous run did not finish, the output is
+        # assembled from the staging area at the end
+        pending = [region for region in region_list if not export_checkpoint.is_done(region.id)]
+        done = len(region_list) - len(pending)
+        stats.total_regions = len(pending)
+
+        def stage_block(region, frame):
+            with stats.stage("write", spots=len(frame)):
+                export_checkpoint.save_region(region, frame)
+
+        run_export(pending, lambda value: export_progress(done + value), stage_block)
+        with stats.stage("assemble"):
+            return export_checkpoint.assemble(region_list, output_format, csv_options)
+
+    with get_writer(csv_filepath, all_columns, output_format, layout, csv_options) as writer:
+        def write_block(region, frame):
+            with stats.stage("write", spots=len(frame)):
+                writer.write_block(frame)
+            stats.bytes_written = writer.bytes_written()
+
+        if streaming:
+            run_export(region_list, export_progress, write_block)
         else:
-            # Create empty DataFrame with correct columns if no data
-            overall_df = pd.DataFrame(columns=all_columns)
-            overall_df.to_csv(csv_filepath, index=False)
\ No newline at end of file
+            all_region_data = []
+            run_export(region_list, export_progress, lambda region, frame: all_region_data.append(frame))
+
+            # Concatenate all regions at once instead of incrementally
+            if all_region_data:
+                write_block(None, concat_region_frames(all_region_data))
+    stats.bytes_written = os.path.getsize(writer.path)
+    return writer.rows_written
+
+
+def concat_region_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate region blocks, keeping ``tissue_id`` dictionary-encoded.
+    """
+    if "tissue_id" not in frames[0].columns:
+        return pd.concat(frames, ignore_index=True)
+    position = frames[0].columns.get_loc("tissue_id")
+    tissue_ids = pd.api.types.union_categoricals([frame["tissue_id"] for frame in frames])
+    frame = pd.concat([frame.drop(columns="tissue_id") for frame in frames], ignore_index=True)
+    frame.insert(position, "tissue_id", tissue_ids)
+    return frame
+
+
+def ignore(*args):
+    """
+    Log or progress callback that discards what it is given.
+    """
+
+
+def get_features(feature_table, feature_list: FeatureList) -> list[Feature]:
+    """
+    Get the features of ``feature_list``.
+    """
+    feature_df = feature_table.get_features(feature_list.id)
+
+    features: list[Feature] = []
+    for row in feature_df.iterrows():
+        features.append(Feature(name=row[1]['name'], id=row[1]['id']))
+    return features
+
+
+def load_region_spots(dataset, region: Region) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fetch the spot ids and coordinates of ``region`` as numpy arrays, integer
+    ids and coordinates narrowed to ``SPOT_ID_DTYPES`` and
+    ``COORDINATE_DTYPES``.
+    """
+    region_spots = dataset.get_region_spots(region.id)
+
+    # Convert to numpy arrays to ensure consistent data types
+    return (
+        compact_ints(region_spots.get("spot_id"), SPOT_ID_DTYPES),
+        compact_ints(region_spots.get("x")),
+        compact_ints(region_spots.get("y")),
+    )
+
+
+def _choose_fetch_strategy(
+    dataset,
+    region_spots: dict[str, tuple],
+    fetch_strategy: str,
+    num_features: int,
+    log: callable = print,
+) -> str:
+    """
+    Resolve ``FETCH_AUTO`` to a concrete strategy.
+
+    Bulk fetching pulls every spot of the dataset for each feature, so it only
+    pays off when the selected regions cover a large share of the dataset and
+    do not overlap (a spot must map onto a single region). It holds the
+    intensities of all regions, so it is also only used when they fit
+    ``BULK_FETCH_MAX_BYTES``.
+    """
+    if fetch_strategy != FETCH_AUTO:
+        return fetch_strategy
+
+    all_spot_ids = [spots[0] for spots in region_spots.values() if len(spots[0])]
+    if not all_spot_ids:
+        return FETCH_PER_REGION
+    selected_spot_ids = np.concatenate(all_spot_ids)
+    if len(np.unique(selected_spot_ids)) != len(selected_spot_ids):
+        return FETCH_PER_REGION
+    # A compact spot id and a float64 value per (spot, feature) at most
+    held_bytes = len(selected_spot_ids) * num_features * (np.dtype(SPOT_ID_DTYPES[0]).itemsize + 8)
+    if held_bytes > BULK_FETCH_MAX_BYTES:
+        log(f"Fetching per region, a bulk fetch would hold up to {held_bytes / 1024**2:,.0f} MB")
+        return FETCH_PER_REGION
+
+    root_id = dataset.get_region_tree().id
+    total_spots = len(dataset.get_region_spots(root_id).get("spot_id"))
+    coverage = len(selected_spot_ids) / total_spots if total_spots else 0.0
+    log(f"Selected regions cover {coverage:.1%} of the dataset spots")
+    return FETCH_BULK if coverage >= BULK_FETCH_MIN_COVERAGE else FETCH_PER_REGION
+
+
+def partition_intensities(
+    spot_index: tuple[np.ndarray, np.ndarray],
+    spot_labels: np.ndarray,
+    intensities,
+    num_regions: int,
+) -> list[FeatureIntensities]:
+    """
+    Split dataset-wide intensities of a single feature into one
+    ``FeatureIntensities`` per region.
+
+    ``spot_index`` is built from the concatenated spot ids of all regions and
+    ``spot_labels`` holds the region position of each of those spots.
+    """
+    rows, found = map_spots_to_rows(spot_index, intensities.spot_ids)
+    labels = spot_labels[rows]
+    # The partitions are held until their region is exported
+    spot_ids = compact_ints(np.asarray(intensities.spot_ids)[found], SPOT_ID_DTYPES)
+    values = np.asarray(intensities.values)[found]
+
+    by_region = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[by_region], np.arange(num_regions + 1))
+    return [
+        FeatureIntensities(
+            spot_ids=spot_ids[by_region[start:end]],
+            values=values[by_region[start:end]],
+        )
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def _bulk_fetch_intensities(
+    dataset,
+    feature_table,
+    region_list: list[Region],
+    region_spots: dict[str, tuple],
+    features: list[Feature],
+) -> dict[str, list[FeatureIntensities]]:
+    """
+    Fetch every feature once for the whole dataset and partition the result
+    into the regions of ``region_list``.
+
+    Returns, per region id, the intensities of each feature in the order of
+    ``features``.
+    """
+    regions = [region for region in region_list if len(region_spots[region.id][0])]
+    spot_ids = np.concatenate([region_spots[region.id][0] for region in regions])
+    spot_labels = np.repeat(
+        np.arange(len(regions)),
+        [len(region_spots[region.id][0]) for region in regions],
+    )
+    spot_index = build_spot_index(spot_ids)
+
+    root_id = dataset.get_region_tree().id
+    region_intensities = {region.id: [] for region in regions}
+    for feature_row in features:
+        intensities = feature_table.get_feature_intensities(feature_row.id, root_id)
+        partitions = partition_intensities(spot_index, spot_labels, intensities, len(regions))
+        for region, partition in zip(regions, partitions):
+            region_intensities[region.id].append(partition)
+    return region_intensities
+
+
+def build_feature_block(region_spot_ids: np.ndarray, feature_intensities, dtype=np.float64) -> np.ndarray:
+    """
+    Build the (spots x features) intensity block of a region, NaN where a
+    feature has no value for a spot, with values of ``dtype``.
+    """
+    # Build the sorted spot index once per region and scatter every
+    # feature into a preallocated (spots x features) block
+    spot_index = build_spot_index(region_spot_ids)
+    feature_block = np.full((len(region_spot_ids), len(feature_intensities)), np.nan, dtype=dtype)
+    return scatter_feature_block(spot_index, feature_intensities, feature_block)
+
+
+def build_sparse_block(region_spot_ids: np.ndarray, feature_intensities, dtype=np.float64) -> SparseBlock:
+    """
+    Build the non-missing intensities of a region as a ``SparseBlock``,
+    straight from the fetched spot ids and values.
+    """
+    rows, cols, values = gather_feature_entries(build_spot_index(region_spot_ids), feature_intensities)
+    if values.dtype.kind == "f":
+        values = values.astype(dtype, copy=False)
+        present = ~np.isnan(values)
+        rows, cols, values = rows[present], cols[present], values[present]
+    order = np.lexsort((cols, rows))
+    return SparseBlock(rows=rows[order], cols=cols[order], values=values[order])
+
+
+def build_aggregate_block(
+    region_spot_ids: np.ndarray, feature_intensities, percentiles=DEFAULT_PERCENTILES
+) -> AggregateBlock:
+    """
+    Compute the per-feature statistics of a region straight from the fetched
+    spot ids and values, see ``region_aggregates``.
+    """
+    _, cols, values = gather_feature_entries(build_spot_index(region_spot_ids), feature_intensities)
+    return aggregate_entries(cols, values, len(feature_intensities), percentiles)
+
+
+def build_region_block(
+    region_spot_ids: np.ndarray,
+    feature_intensities,
+    layout: str = LAYOUT_WIDE,
+    percentiles=DEFAULT_PERCENTILES,
+    value_dtype=np.float64,
+):
+    """
+    Build the intensities of a region for ``layout``, a dense feature block
+    for ``LAYOUT_WIDE``, an ``AggregateBlock`` for ``LAYOUT_AGGREGATE`` and a
+    ``SparseBlock`` otherwise. Intensities are held as ``value_dtype``,
+    statistics are always computed in float64.
+    """
+    if layout == LAYOUT_WIDE:
+        return build_feature_block(region_spot_ids, feature_intensities, value_dtype)
+    if layout == LAYOUT_AGGREGATE:
+        return build_aggregate_block(region_spot_ids, feature_intensities, percentiles)
+    return build_sparse_block(region_spot_ids, feature_intensities, value_dtype)
+
+
+def build_region_frame(
+    region: Region,
+    region_spot_ids: np.ndarray,
+    region_spot_x: np.ndarray,
+    region_spot_y: np.ndarray,
+    feature_block: np.ndarray,
+    all_columns: list[str],
+) -> pd.DataFrame:
+    """
+    Assemble the output rows of a region from its spots and feature block.
+    """
+    # Pre-allocate data dictionary with all columns, keyed by position since
+    # features may share a name
+    region_data = {
+        0: region_spot_ids,
+        1: region_spot_x,
+        2: region_spot_y,
+        3: tissue_column(region, len(region_spot_ids)),
+    }
+    for j in range(len(all_columns) - len(BASE_COLUMNS)):
+        region_data[len(BASE_COLUMNS) + j] = feature_block[:, j]
+
+    # Create DataFrame from complete data dictionary
+    frame = pd.DataFrame(region_data)
+    frame.columns = all_columns
+    return frame
+
+
+def build_long_frame(
+    region: Region,
+    region_spot_ids: np.ndarray,
+    region_spot_x: np.ndarray,
+    region_spot_y: np.ndarray,
+    sparse_block: SparseBlock,
+    all_columns: list[str],
+) -> pd.DataFrame:
+    """
+    Assemble the ``LONG_COLUMNS`` rows of a region, one per non-missing
+    intensity of ``sparse_block``.
+    """
+    rows = sparse_block.rows
+    feature_names = np.asarray(all_columns[len(BASE_COLUMNS):], dtype=object)
+    return pd.DataFrame(
+        {
+            "spotId": region_spot_ids[rows],
+            "x": region_spot_x[rows],
+            "y": region_spot_y[rows],
+            "tissue_id": tissue_column(region, len(rows)),
+            "feature": feature_names[sparse_block.cols],
+            "value": sparse_block.values,
+        },
+        columns=LONG_COLUMNS,
+    )
+
+
+def build_aggregate_frame(
+    region: Region,
+    num_spots: int,
+    aggregate_block: AggregateBlock,
+    all_columns: list[str],
+) -> pd.DataFrame:
+    """
+    Assemble the single output row of a region from its ``AggregateBlock``.
+    """
+    feature_names = all_columns[len(BASE_COLUMNS):]
+    stat_columns = [f"{feature} {stat}" for feature in feature_names for stat in aggregate_block.stat_names]
+    frame = pd.DataFrame(aggregate_block.values.reshape(1, -1), columns=stat_columns)
+    # By position, features of a multi-list export may share a name
+    for position in range(0, len(stat_columns), len(aggregate_block.stat_names)):
+        frame.isetitem(position, frame.iloc[:, position].astype(np.int64))
+    frame.insert(0, "region_id", str(region.id))
+    frame.insert(1, "tissue_id", region.name.split("/")[-1])
+    frame.insert(2, "spot_count", num_spots)
+    return frame
+
+
+def build_region_output(
+    region: Region,
+    region_spot_ids: np.ndarray,
+    region_spot_x: np.ndarray,
+    region_spot_y: np.ndarray,
+    region_block,
+    all_columns: list[str],
+    layout: str = LAYOUT_WIDE,
+):
+    """
+    Turn the spots and the block returned by ``build_region_block`` into what
+    the writer of ``layout`` expects.
+    """
+    if layout == LAYOUT_LONG:
+        return build_long_frame(region, region_spot_ids, region_spot_x, region_spot_y, region_block, all_columns)
+    if layout == LAYOUT_AGGREGATE:
+        return build_aggregate_frame(region, len(region_spot_ids), region_block, all_columns)
+    if layout == LAYOUT_SPARSE:
+        return SparseRegionBlock(
+            tissue_id=region.name.split("/")[-1],
+            spot_ids=region_spot_ids,
+            x=region_spot_x,
+            y=region_spot_y,
+            block=region_block,
+        )
+    return build_region_frame(region, region_spot_ids, region_spot_x, region_spot_y, region_block, all_columns)
+
+
+def _fetch_region(
+    dataset,
+    feature_table,
+    region: Region,
+    features: list[Feature],
+    region_spots: dict[str, tuple],
+    bulk_intensities: dict[str, list[FeatureIntensities]] = None,
+    stats: ExportStats = None,
+) -> tuple[tuple[np.ndarray, np.ndarray, np.ndarray], list[FeatureIntensities] | None]:
+    """
+    Fetch the spots and feature intensities of ``region``, taking them from
+    ``region_spots`` and ``bulk_intensities`` when already loaded. The
+    intensities are None when the region has no spots.
+    """
+    if region.id in region_spots:
+        spots = region_spots.pop(region.id)
+    else:
+        with stats.stage("get_region_spots"):
+            spots = load_region_spots(dataset, region)
+    num_spots = len(spots[0])
+    if num_spots == 0:
+        return spots, None
+
+    if bulk_intensities is not None:
+        return spots, bulk_intensities.pop(region.id)
+    with stats.stage("get_feature_intensities", calls=len(features), spots=num_spots):
+        feature_intensities = [
+            feature_table.get_feature_intensities(feature_row.id, region.id)
+            for feature_row in features
+        ]
+    return spots, feature_intensities
+
+
+def _assemble_region(
+    region: Region,
+    spots: tuple[np.ndarray, np.ndarray, np.ndarray],
+    feature_intensities: list[FeatureIntensities],
+    all_columns: list[str],
+    layout: str = LAYOUT_WIDE,
+    stats: ExportStats = None,
+    percentiles=DEFAULT_PERCENTILES,
+    value_dtype=np.float64,
+):
+    """
+    Build the output block of a region from its fetched spots and intensities.
+    """
+    region_spot_ids, region_spot_x, region_spot_y = spots
+    num_spots = len(region_spot_ids)
+    with stats.stage("fill", spots=num_spots):
+        feature_block = build_region_block(
+            region_spot_ids, feature_intensities, layout, percentiles, value_dtype
+        )
+
+    with stats.stage("dataframe", spots=num_spots):
+        return build_region_output(
+            region, region_spot_ids, region_spot_x, region_spot_y, feature_block, all_columns, layout
+        )
+
+
+def _export_regions(
+    dataset,
+    feature_table,
+    region_list: list[Region],
+    features: list[Feature],
+    all_columns: list[str],
+    export_progress: callable,
+    discarded_regions: list[Region],
+    emit_block: callable,
+    fetch_strategy: str = FETCH_PER_REGION,
+    log: callable = print,
+    stats: ExportStats = None,
+    layout: str = LAYOUT_WIDE,
+    pipeline: bool = False,
+    percentiles=DEFAULT_PERCENTILES,
+    value_dtype=np.float64,
+    region_spots: dict[str, tuple] = None,
+):
+    """
+    Build the block of every region and hand it to ``emit_block(region, frame)``.
+    Spots already loaded by the caller are taken out of ``region_spots``, in
+    the form of ``load_region_spots``.
+
+    With ``pipeline`` enabled fetching, assembling and writing run in
+    overlapping stages, see ``pipeline_export``.
+    """
+    stats = stats or ExportStats(len(region_list), log=ignore)
+    region_spots = {} if region_spots is None else region_spots
+    bulk_intensities = None
+    if fetch_strategy != FETCH_PER_REGION:
+        # Spots of every region are needed up front to decide on and to
+        # partition a bulk fetch
+        for region in region_list:
+            if region.id not in region_spots:
+                with stats.stage("get_region_spots"):
+                    region_spots[region.id] = load_region_spots(dataset, region)
+        fetch_strategy = _choose_fetch_strategy(dataset, region_spots, fetch_strategy, len(features), log)
+
+    log(f"Fetching feature intensities {fetch_strategy.replace('_', '-')}")
+    if fetch_strategy == FETCH_BULK:
+        with stats.stage("get_feature_intensities", calls=len(features)):
+            bulk_intensities = _bulk_fetch_intensities(
+                dataset, feature_table, region_list, region_spots, features
+            )
+
+    def fetch(region, region_stats):
+        return _fetch_region(
+            dataset, feature_table, region, features, region_spots, bulk_intensities, region_stats
+        )
+
+    def assemble(region, spots, feature_intensities, region_stats):
+        return _assemble_region(
+            region, spots, feature_intensities, all_columns, layout, region_stats, percentiles, value_dtype
+        )
+
+    if pipeline:
+        from pipeline_export import export_regions_pipelined
+
+        export_regions_pipelined(
+            region_list, fetch, assemble, export_progress, discarded_regions, emit_block, log, stats
+        )
+    else:
+        for i, region in enumerate(region_list):
+            log(f"Processing region {i + 1}/{len(region_list)}: {region.name}")
+            export_progress(i)
+            stats.region_started(region)
+
+            spots, feature_intensities = fetch(region, stats)
+            if feature_intensities is None:
+                log(f"Region id:{region.id} and Region name: {region.name} has no valid spots.")
+                discarded_regions.append(region)
+                stats.region_done()
+                continue
+
+            emit_block(region, assemble(region, spots, feature_intensities, stats))
+            stats.region_done(len(spots[0]))
+
+    export_progress(len(region_list))
+
+    per_region_calls = (len(region_list) - len(discarded_regions)) * len(features)
+    intensity_calls = len(features) if bulk_intensities is not None else per_region_calls
+    log(
+        f"get_feature_intensities calls: {intensity_calls} "
+        f"(per-region fetching: {per_region_calls})"
+    )
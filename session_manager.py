@@ -0,0 +1,146 @@
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+
+# Seconds an unused session stays open before it is closed
+DEFAULT_IDLE_TIMEOUT = 300.0
+
+
+def open_local_session(file_path: str):
+    """
+    Open a SCiLS ``LocalSession``, scilslab is imported on first use only.
+    """
+    from scilslab import LocalSession
+
+    return LocalSession(file_path)
+
+
+class _SessionEntry:
+    def __init__(self):
+        self.session = None
+        self.ref_count = 0
+        self.idle_timer = None
+        # Serializes opening and closing of this file only
+        self.lock = threading.Lock()
+
+
+class SessionManager:
+    """
+    Keeps one ``LocalSession`` open per SLX file and shares it between the
+    feature loader and the exports.
+
+    Sessions are reference counted. When the last user releases a session it
+    stays open for ``idle_timeout`` seconds so that a following export of the
+    same file does not pay for opening it again. All methods are safe to call
+    from ``QThreadPool`` workers; calls into the session itself are not
+    serialized by the manager. ``session_factory`` opens a session for a
+    path, it can be replaced by a stand-in such as the synthetic session of
+    the benchmarks.
+    """
+
+    def __init__(self, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, session_factory=open_local_session):
+        self.idle_timeout = idle_timeout
+        self.session_factory = session_factory
+        self._entries: dict[str, _SessionEntry] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def acquire(self, file_path: str):
+        """
+        Return the shared session of ``file_path``, opening it if needed.
+        Every call must be paired with ``release``.
+        """
+        key = self._key(file_path)
+        with self._lock:
+            entry = self._entries.setdefault(key, _SessionEntry())
+            entry.ref_count += 1
+            if entry.idle_timer is not None:
+                entry.idle_timer.cancel()
+                entry.idle_timer = None
+
+        try:
+            with entry.lock:
+                if entry.session is None:
+                    entry.session = self.session_factory(file_path)
+                return entry.session
+        except Exception:
+            self.release(file_path)
+            raise
+
+    def release(self, file_path: str):
+        """
+        Release a session returned by ``acquire``. The session is closed once
+        it has not been used for ``idle_timeout`` seconds.
+        """
+        key = self._key(file_path)
+        with self._lock:
+            entry = self._entries[key]
+            entry.ref_count -= 1
+            if entry.ref_count > 0:
+                return
+            if self.idle_timeout <= 0:
+                self._entries.pop(key)
+            else:
+                entry.idle_timer = threading.Timer(self.idle_timeout, self._close_if_idle, (key, entry))
+                entry.idle_timer.daemon = True
+                entry.idle_timer.start()
+                return
+        self._close_entry(entry)
+
+    @contextmanager
+    def session(self, file_path: str):
+        """
+        Context manager around ``acquire`` and ``release``.
+        """
+        session = self.acquire(file_path)
+        try:
+            yield session
+        finally:
+            self.release(file_path)
+
+    def _close_if_idle(self, key: str, entry: _SessionEntry):
+        with self._lock:
+            if entry.ref_count > 0 or self._entries.get(key) is not entry:
+                return
+            self._entries.pop(key)
+        self._close_entry(entry)
+
+    def close_idle(self, file_path: str):
+        """
+        Close the session of ``file_path`` right away if nobody is using it,
+        e.g. before other processes open the file.
+        """
+        key = self._key(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.ref_count > 0:
+                return
+            self._entries.pop(key)
+            if entry.idle_timer is not None:
+                entry.idle_timer.cancel()
+        self._close_entry(entry)
+
+    def close_all(self):
+        """
+        Close every idle session, sessions still in use are left open.
+        """
+        with self._lock:
+            keys = list(self._entries)
+        for key in keys:
+            self.close_idle(key)
+
+    @staticmethod
+    def _close_entry(entry: _SessionEntry):
+        with entry.lock:
+            if entry.session is not None:
+                entry.session.close()
+                entry.session = None
+
+
+# Global session manager shared by the loader and the exports
+session_manager = SessionManager()
+atexit.register(session_manager.close_all)
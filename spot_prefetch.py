@@ -0,0 +1,132 @@
+import os
+import threading
+from session_manager import session_manager
+
+# Memory the prefetched spots may take, regions beyond it are left to the export
+DEFAULT_PREFETCH_BUDGET = 256 * 1024**2
+
+
+def _file_key(file_path: str) -> tuple:
+    # A changed SLX file invalidates the prefetched spots
+    stat = os.stat(file_path)
+    return os.path.normcase(os.path.abspath(file_path)), stat.st_size, stat.st_mtime_ns
+
+
+class SpotPrefetcher:
+    """
+    Loads the spot ids and coordinates of the leaf regions of an SLX file in
+    the background, so that the export of the file does not start cold.
+
+    ``prefetch`` is run on a ``QThreadPool`` worker once the metadata of a
+    file is loaded. The spots of one file are held in memory, in the compact
+    form of ``scils_utils.load_region_spots``, up to ``max_bytes``; regions
+    that do not fit are left to the export. ``cancel`` stops a running
+    prefetch and drops the spots, e.g. when another file is selected.
+    ``generate_csv`` reads the spots through ``wrap``.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_PREFETCH_BUDGET):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Held while the prefetch talks to the session, see stop
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._key = None
+        self._spots: dict[str, tuple] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, file_path: str, regions: list, log: callable = print) -> int:
+        """
+        Load the spots of ``regions`` of ``file_path`` that are not held yet.
+        Returns the number of regions loaded by this call.
+        """
+        from scils_utils import load_region_spots
+
+        self.stop()
+        stop = self._stop = threading.Event()
+        key = _file_key(file_path)
+        with self._lock:
+            if key != self._key:
+                self._key, self._spots, self._bytes = key, {}, 0
+
+        loaded = 0
+        with self._running, session_manager.session(file_path) as session:
+            dataset = session.dataset_proxy
+            for region in regions:
+                if stop.is_set():
+                    return loaded
+                if region.id in self._spots:
+                    continue
+                spots = load_region_spots(dataset, region)
+                size = sum(array.nbytes for array in spots)
+                with self._lock:
+                    if stop.is_set() or self._key != key:
+                        return loaded
+                    if self._bytes + size > self.max_bytes:
+                        log(f"Prefetched spots of {loaded} regions, memory budget reached")
+                        return loaded
+                    self._spots[region.id] = spots
+                    self._bytes += size
+                loaded += 1
+        if loaded:
+            log(f"Prefetched spots of {loaded} regions of {os.path.basename(file_path)}")
+        return loaded
+
+    def stop(self):
+        """
+        Stop a running prefetch and wait until it no longer uses the session.
+        The spots loaded so far are kept.
+        """
+        self._stop.set()
+        with self._running:
+            pass
+
+    def cancel(self):
+        """
+        Stop a running prefetch and drop the prefetched spots. Does not wait
+        for the prefetch, it is safe to call from the GUI thread.
+        """
+        self._stop.set()
+        with self._lock:
+            self._key, self._spots, self._bytes = None, {}, 0
+
+    def get_region_spots(self, file_path: str, region_id: str) -> dict | None:
+        with self._lock:
+            spots = self._spots.get(region_id) if self._key == _file_key(file_path) else None
+            if spots is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return dict(zip(("spot_id", "x", "y"), spots))
+
+    def wrap(self, dataset, file_path: str) -> "PrefetchedDataset":
+        """
+        Return a proxy of ``dataset`` serving the prefetched spots. A running
+        prefetch is stopped first, the session then belongs to the caller.
+        """
+        self.stop()
+        self.hits = self.misses = 0
+        return PrefetchedDataset(dataset, self, file_path)
+
+
+class PrefetchedDataset:
+    """
+    Dataset proxy that serves ``get_region_spots`` from a ``SpotPrefetcher``
+    and forwards everything else to the wrapped dataset.
+    """
+
+    def __init__(self, dataset, prefetcher: SpotPrefetcher, file_path: str):
+        self._dataset = dataset
+        self._prefetcher = prefetcher
+        self._file_path = file_path
+
+    def get_region_spots(self, region_id):
+        region_spots = self._prefetcher.get_region_spots(self._file_path, region_id)
+        if region_spots is None:
+            region_spots = self._dataset.get_region_spots(region_id)
+        return region_spots
+
+    def __getattr__(self, name):
+        return getattr(self._dataset, name)
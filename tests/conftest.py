@@ -0,0 +1,33 @@
+"""
+Exports of the tests run on the synthetic session of the benchmarks, opened
+through ``session_manager`` like an SLX file.
+"""
+import pytest
+from benchmarks.synthetic_session import SyntheticConfig, SyntheticSession
+from scils_utils import get_feature_lists, get_region_list
+from session_manager import session_manager
+
+
+@pytest.fixture
+def synthetic_file(tmp_path, monkeypatch):
+    """
+    Return ``open_synthetic(config, session_class)``, which points
+    ``session_manager`` at a ``session_class`` session on ``config`` and
+    returns the path of an empty SLX file with the regions and feature lists
+    of the session. Sessions are closed after the test.
+    """
+    slx_filepath = tmp_path / "synthetic.slx"
+    slx_filepath.touch()
+
+    def open_synthetic(config: SyntheticConfig = None, session_class=SyntheticSession):
+        config = config or SyntheticConfig(regions=3, spots_per_region=300, features=8, sparsity=0.3)
+        # Sessions of a previous open_synthetic are not reused
+        session_manager.close_all()
+        monkeypatch.setattr(session_manager, "session_factory", lambda file_path: session_class(config))
+        with session_manager.session(str(slx_filepath)) as session:
+            regions = get_region_list(session, str(slx_filepath))
+            feature_lists = get_feature_lists(session, str(slx_filepath))
+        return str(slx_filepath), regions, feature_lists
+
+    yield open_synthetic
+    session_manager.close_all()
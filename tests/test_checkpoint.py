@@ -0,0 +1,59 @@
+"""
+A checkpointed export interrupted in the middle of a region, then resumed.
+Run from the repository root:
+
+    python -m pytest tests
+"""
+import os
+import pytest
+from benchmarks.synthetic_session import SyntheticConfig, SyntheticSession
+from scils_utils import generate_csv
+
+
+class RecordingSession(SyntheticSession):
+    """
+    Synthetic session recording the regions whose intensities are fetched,
+    fetching those of ``failing_region`` fails.
+    """
+
+    fetched_regions: list[str] = []
+    failing_region: str = None
+
+    def __init__(self, config: SyntheticConfig):
+        super().__init__(config)
+        feature_table = self.dataset_proxy.feature_table
+        get_feature_intensities = feature_table.get_feature_intensities
+
+        def record(feature_id, region_id):
+            if region_id == self.failing_region:
+                raise RuntimeError(f"Lost the connection while reading {region_id}")
+            self.fetched_regions.append(region_id)
+            return get_feature_intensities(feature_id, region_id)
+
+        feature_table.get_feature_intensities = record
+
+
+def export(slx_filepath, path, regions, feature_list, **options):
+    return generate_csv(slx_filepath, str(path), regions, feature_list, log=lambda message: None, **options)
+
+
+def test_resume(tmp_path, synthetic_file, monkeypatch):
+    config = SyntheticConfig(regions=4, spots_per_region=300, features=8)
+    slx_filepath, regions, feature_lists = synthetic_file(config, RecordingSession)
+    expected = tmp_path / "expected.csv"
+    export(slx_filepath, expected, regions, feature_lists[0])
+
+    path = tmp_path / "out.csv"
+    monkeypatch.setattr(RecordingSession, "failing_region", regions[2].id)
+    with pytest.raises(RuntimeError):
+        export(slx_filepath, path, regions, feature_lists[0], checkpoint=True)
+    assert not path.exists()
+    assert os.path.isdir(f"{path}.staging")
+
+    monkeypatch.setattr(RecordingSession, "failing_region", None)
+    monkeypatch.setattr(RecordingSession, "fetched_regions", [])
+    export(slx_filepath, path, regions, feature_lists[0], checkpoint=True)
+    # The regions staged before the failure are not read again
+    assert set(RecordingSession.fetched_regions) == {region.id for region in regions[2:]}
+    assert path.read_bytes() == expected.read_bytes()
+    assert not os.path.exists(f"{path}.staging")
@@ -0,0 +1,52 @@
+"""
+Compressed output read back with the standard decompressors. Run from the
+repository root:
+
+    python -m pytest tests
+"""
+import gzip
+import pytest
+import compression
+from compression import open_compressed_text
+from scils_utils import generate_csv
+
+
+def decompress(path, kind: str) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    if kind == "gzip":
+        return gzip.decompress(data)
+    import zstandard
+
+    # Every block is a frame of its own, read them all
+    return zstandard.ZstdDecompressor().decompressobj(read_across_frames=True).decompress(data)
+
+
+@pytest.mark.parametrize("kind", ["gzip", "zstd"])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_round_trip(tmp_path, monkeypatch, kind, workers):
+    if kind == "zstd":
+        pytest.importorskip("zstandard")
+    # Many small blocks, each one a gzip member or zstd frame
+    monkeypatch.setattr(compression, "COMPRESS_BLOCK_SIZE", 1000)
+    text = "".join(f"{i},é{i * 0.5}\n" for i in range(5000))
+    path = tmp_path / "out.gz"
+    f, stream = open_compressed_text(str(path), kind, workers, newline="")
+    with f:
+        for start in range(0, len(text), 777):
+            f.write(text[start:start + 777])
+    assert decompress(path, kind) == text.encode("utf-8")
+    assert stream.bytes_written == path.stat().st_size
+
+
+def test_export(tmp_path, synthetic_file, monkeypatch):
+    slx_filepath, regions, feature_lists = synthetic_file()
+    plain = tmp_path / "out.csv"
+    generate_csv(slx_filepath, str(plain), regions, feature_lists[0], log=lambda message: None)
+    monkeypatch.setattr(compression, "COMPRESS_BLOCK_SIZE", 10_000)
+    compressed = tmp_path / "out.csv.gz"
+    generate_csv(
+        slx_filepath, str(compressed), regions, feature_lists[0], log=lambda message: None,
+        csv_options={"compress_workers": 2},
+    )
+    assert decompress(compressed, "gzip") == plain.read_bytes()
@@ -0,0 +1,90 @@
+"""
+The CSV writer against ``DataFrame.to_csv``, which wrote the output before
+``csv_format`` did. Run from the repository root:
+
+    python -m pytest tests
+"""
+import gzip
+import numpy as np
+import pandas as pd
+import pytest
+import csv_format
+import export_writers
+from export_writers import CsvWriter
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    values = rng.random((50, 3))
+    values[rng.random((50, 3)) < 0.3] = np.nan
+    return pd.DataFrame(
+        {
+            "spotId": np.arange(50, dtype=np.int32),
+            "x": np.arange(50, dtype=np.int16) % 7,
+            "y": np.arange(50, dtype=np.int16) // 7,
+            "tissue_id": pd.Categorical(["a, b"] * 25 + ['say "c"'] * 25),
+            "name": np.array(["plain", None, "new\nline", "x"] * 12 + ["y", "z"], dtype=object),
+            "mz 1": values[:, 0],
+            "mz 2": values[:, 1],
+            "mz 3": values[:, 2],
+        }
+    )
+
+
+def write_csv(path, frame, blocks=1, **options):
+    writer = CsvWriter(str(path), list(frame.columns), **options)
+    with writer:
+        for block in np.array_split(np.arange(len(frame)), blocks):
+            writer.write_block(frame.iloc[block])
+    return path.read_bytes()
+
+
+def to_csv(path, frame, float_precision=None, na_rep=""):
+    if float_precision is not None:
+        frame = frame.round(float_precision)
+    frame.to_csv(path, index=False, na_rep=na_rep, lineterminator=csv_format.LINE_TERMINATOR)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("float_precision", [None, 3])
+@pytest.mark.parametrize("na_rep", ["", "NA"])
+def test_matches_to_csv(tmp_path, frame, float_precision, na_rep):
+    expected = to_csv(tmp_path / "expected.csv", frame, float_precision, na_rep)
+    written = write_csv(tmp_path / "out.csv", frame, blocks=3, float_precision=float_precision, na_rep=na_rep)
+    assert written == expected
+
+
+@pytest.mark.parametrize("line_terminator", ["\n", "\r\n"])
+def test_line_endings(tmp_path, frame, monkeypatch, line_terminator):
+    # The header, the formatter and the to_csv fallback end lines alike
+    monkeypatch.setattr(csv_format, "LINE_TERMINATOR", line_terminator)
+    fallback = frame.assign(when=pd.Timestamp("2024-01-01"))
+    assert not csv_format.can_format(fallback)
+    for data in (frame, fallback):
+        written = write_csv(tmp_path / "out.csv", data, blocks=2)
+        assert written.endswith(line_terminator.encode())
+        assert written == to_csv(tmp_path / "expected.csv", data)
+
+
+@pytest.mark.parametrize("format_workers", [1, 2])
+def test_chunks(tmp_path, frame, monkeypatch, format_workers):
+    expected = to_csv(tmp_path / "expected.csv", frame, na_rep="NA")
+    # A few rows per chunk, chunks are sized by values whatever the workers
+    monkeypatch.setattr(export_writers, "FORMAT_CHUNK_VALUES", 40)
+    written = write_csv(tmp_path / "out.csv", frame, blocks=2, na_rep="NA", format_workers=format_workers)
+    assert written == expected
+
+
+@pytest.mark.parametrize("extension", [".csv", ".csv.gz"])
+def test_utf8(tmp_path, frame, extension):
+    # Names outside the locale encoding, e.g. cp1252 on Windows
+    frame = frame.assign(tissue_id=pd.Categorical(["Région β"] * 25 + ["脳 ✓"] * 25))
+    frame = frame.rename(columns={"mz 1": "m/z 1 ± 0.5"})
+    expected = to_csv(tmp_path / "expected.csv", frame)
+    path = tmp_path / f"out{extension}"
+    writer = CsvWriter(str(path), list(frame.columns), compression="gzip" if extension.endswith(".gz") else None)
+    with writer:
+        writer.write_block(frame)
+    written = gzip.decompress(path.read_bytes()) if extension.endswith(".gz") else path.read_bytes()
+    assert written == expected
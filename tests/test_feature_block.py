@@ -0,0 +1,72 @@
+"""
+The vectorized feature block against the per-spot loop it replaced, on the
+synthetic session of the benchmarks. Run from the repository root:
+
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+from benchmarks.synthetic_session import SyntheticConfig, SyntheticSession
+from scils_utils import FeatureIntensities, build_feature_block
+
+
+def loop_feature_block(region_spot_ids, feature_intensities) -> np.ndarray:
+    """
+    The block as the original export built it, one dict lookup per spot.
+    """
+    block = np.full((len(region_spot_ids), len(feature_intensities)), np.nan)
+    spot_id_to_idx = {spot_id: idx for idx, spot_id in enumerate(region_spot_ids)}
+    for col, intensities in enumerate(feature_intensities):
+        for spot_id, intensity in zip(intensities.spot_ids, intensities.values):
+            if spot_id in spot_id_to_idx:
+                block[spot_id_to_idx[spot_id], col] = intensity
+    return block
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    config = SyntheticConfig(regions=3, spots_per_region=2_000, features=12, sparsity=0.4)
+    with SyntheticSession(config) as session:
+        yield session.dataset_proxy
+
+
+def region_intensities(dataset, region_id):
+    feature_table = dataset.feature_table
+    features = feature_table.get_features(None)
+    return [feature_table.get_feature_intensities(feature_id, region_id) for feature_id in features["id"]]
+
+
+@pytest.mark.parametrize("region_id", ["region_0", "region_1", "region_2"])
+def test_matches_loop(dataset, region_id):
+    spot_ids = dataset.get_region_spots(region_id)["spot_id"]
+    feature_intensities = region_intensities(dataset, region_id)
+    np.testing.assert_array_equal(
+        build_feature_block(spot_ids, feature_intensities),
+        loop_feature_block(spot_ids, feature_intensities),
+    )
+
+
+def test_unsorted_spots_and_foreign_spot_ids(dataset):
+    # Spots in an arbitrary order, intensities also listing spots of other
+    # regions, which must be ignored
+    rng = np.random.default_rng(1)
+    spot_ids = rng.permutation(dataset.get_region_spots("region_1")["spot_id"])
+    feature_intensities = region_intensities(dataset, "regions")
+    feature_intensities = [
+        FeatureIntensities(spot_ids=intensities.spot_ids[::-1], values=intensities.values[::-1])
+        for intensities in feature_intensities
+    ]
+    expected = loop_feature_block(spot_ids, feature_intensities)
+    np.testing.assert_array_equal(build_feature_block(spot_ids, feature_intensities), expected)
+    np.testing.assert_array_equal(
+        build_feature_block(spot_ids.astype(np.int32), feature_intensities, np.float32),
+        expected.astype(np.float32),
+    )
+
+
+def test_empty_features(dataset):
+    spot_ids = dataset.get_region_spots("region_0")["spot_id"]
+    empty = FeatureIntensities(spot_ids=np.empty(0, dtype=np.int64), values=np.empty(0))
+    block = build_feature_block(spot_ids, [empty, empty])
+    assert block.shape == (len(spot_ids), 2)
+    assert np.isnan(block).all()
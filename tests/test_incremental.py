@@ -0,0 +1,75 @@
+"""
+Incremental exports only read the regions that were added or changed since
+the previous export. Run from the repository root:
+
+    python -m pytest tests
+"""
+from benchmarks.synthetic_session import SyntheticConfig, SyntheticDataset, SyntheticSession
+from scils_utils import generate_csv
+
+CONFIG = SyntheticConfig(regions=4, spots_per_region=300, features=8)
+
+
+class EditedDataset(SyntheticDataset):
+    """
+    Synthetic dataset whose ``region_1`` lost every other spot.
+    """
+
+    def region_spot_ids(self, region_id: str):
+        spot_ids = super().region_spot_ids(region_id)
+        return spot_ids[::2] if region_id == "region_1" else spot_ids
+
+
+class RecordingSession(SyntheticSession):
+    """
+    Synthetic session recording the regions whose intensities are fetched.
+    """
+
+    dataset_class = SyntheticDataset
+    fetched_regions: list[str] = []
+
+    def __init__(self, config: SyntheticConfig):
+        self.dataset_proxy = self.dataset_class(config)
+        feature_table = self.dataset_proxy.feature_table
+        get_feature_intensities = feature_table.get_feature_intensities
+
+        def record(feature_id, region_id):
+            self.fetched_regions.append(region_id)
+            return get_feature_intensities(feature_id, region_id)
+
+        feature_table.get_feature_intensities = record
+
+
+class EditedSession(RecordingSession):
+    dataset_class = EditedDataset
+
+
+def export(slx_filepath, path, regions, feature_list, **options):
+    return generate_csv(slx_filepath, str(path), regions, feature_list, log=lambda message: None, **options)
+
+
+def test_changed_region(tmp_path, synthetic_file, monkeypatch):
+    path = tmp_path / "out.csv"
+    slx_filepath, regions, feature_lists = synthetic_file(CONFIG, RecordingSession)
+    export(slx_filepath, path, regions, feature_lists[0], incremental=True)
+
+    slx_filepath, regions, feature_lists = synthetic_file(CONFIG, EditedSession)
+    expected = tmp_path / "expected.csv"
+    export(slx_filepath, expected, regions, feature_lists[0])
+    monkeypatch.setattr(RecordingSession, "fetched_regions", [])
+    export(slx_filepath, path, regions, feature_lists[0], incremental=True)
+    assert set(RecordingSession.fetched_regions) == {"region_1"}
+    assert path.read_bytes() == expected.read_bytes()
+
+
+def test_added_region(tmp_path, synthetic_file, monkeypatch):
+    path = tmp_path / "out.csv"
+    slx_filepath, regions, feature_lists = synthetic_file(CONFIG, RecordingSession)
+    expected = tmp_path / "expected.csv"
+    export(slx_filepath, expected, regions, feature_lists[0])
+    export(slx_filepath, path, regions[:3], feature_lists[0], incremental=True)
+
+    monkeypatch.setattr(RecordingSession, "fetched_regions", [])
+    export(slx_filepath, path, regions, feature_lists[0], incremental=True)
+    assert set(RecordingSession.fetched_regions) == {"region_3"}
+    assert path.read_bytes() == expected.read_bytes()
@@ -0,0 +1,59 @@
+"""
+An export of several feature lists in one pass against separate exports of
+each list. Run from the repository root:
+
+    python -m pytest tests
+"""
+import pandas as pd
+import pytest
+from benchmarks.synthetic_session import SyntheticDataset, SyntheticFeatureTable, SyntheticSession
+from multi_export import export_feature_lists, feature_list_paths
+from scils_utils import generate_csv
+
+# Overlapping feature lists, feature_7 has the name of feature_0
+FEATURE_LISTS = {
+    "first": ["feature_0", "feature_1", "feature_2", "feature_3", "feature_4"],
+    "second": ["feature_6", "feature_3", "feature_7", "feature_4"],
+}
+
+
+class ListsFeatureTable(SyntheticFeatureTable):
+    def __init__(self, dataset: SyntheticDataset):
+        super().__init__(dataset)
+        names = self._features.set_index("id")["name"]
+        self._features.loc[self._features["id"] == "feature_7", "name"] = names["feature_0"]
+
+    def get_feature_lists(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "name": list(FEATURE_LISTS),
+            "id": list(FEATURE_LISTS),
+            "num_features": [len(ids) for ids in FEATURE_LISTS.values()],
+        })
+
+    def get_features(self, feature_list_id: str) -> pd.DataFrame:
+        return self._features.set_index("id").loc[FEATURE_LISTS[feature_list_id]].reset_index()
+
+
+class ListsDataset(SyntheticDataset):
+    def __init__(self, config):
+        super().__init__(config)
+        self.feature_table = ListsFeatureTable(self)
+
+
+class ListsSession(SyntheticSession):
+    def __init__(self, config):
+        self.dataset_proxy = ListsDataset(config)
+
+
+@pytest.mark.parametrize("layout", ["wide", "long", "aggregate"])
+def test_matches_single_exports(tmp_path, synthetic_file, layout):
+    slx_filepath, regions, feature_lists = synthetic_file(session_class=ListsSession)
+    path = tmp_path / "multi.csv"
+    export_feature_lists(slx_filepath, str(path), regions, feature_lists, log=lambda message: None, layout=layout)
+
+    outputs = feature_list_paths(str(path), feature_lists)
+    for feature_list, output in zip(feature_lists, outputs):
+        expected = tmp_path / f"{feature_list.id}.csv"
+        generate_csv(slx_filepath, str(expected), regions, feature_list, log=lambda message: None, layout=layout)
+        with open(output, "rb") as f:
+            assert f.read() == expected.read_bytes(), feature_list.name
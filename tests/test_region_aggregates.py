@@ -0,0 +1,77 @@
+"""
+The grouped statistics of ``region_aggregates`` against the numpy NaN
+reductions, per feature. Run from the repository root:
+
+    python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from region_aggregates import aggregate_entries, stat_names
+from scils_utils import generate_csv
+
+PERCENTILES = (5.0, 25.0, 75.0, 99.0)
+
+
+def numpy_stats(values: np.ndarray, percentiles=PERCENTILES) -> list[float]:
+    """
+    The statistics of one feature as ``aggregate_entries`` names them.
+    """
+    count = np.count_nonzero(~np.isnan(values))
+    if count == 0:
+        return [0] + [np.nan] * (len(stat_names(percentiles)) - 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.nanstd(values, ddof=1) if count > 1 else np.nan
+    return [
+        count,
+        np.nanmean(values),
+        std,
+        np.nanmin(values),
+        np.nanmax(values),
+        np.nanmedian(values),
+        *np.nanpercentile(values, percentiles),
+    ]
+
+
+def test_matches_numpy():
+    rng = np.random.default_rng(0)
+    # Features with many, two, one and no values, and NaN entries
+    sizes = [500, 37, 2, 1, 0, 200]
+    columns = [rng.normal(100.0, 20.0, size) for size in sizes]
+    columns[0][rng.random(500) < 0.2] = np.nan
+    columns[5][:] = np.nan
+    cols = np.concatenate([np.full(len(values), k) for k, values in enumerate(columns)])
+    values = np.concatenate(columns)
+    order = rng.permutation(len(values))
+
+    block = aggregate_entries(cols[order], values[order], len(columns) + 1, PERCENTILES)
+    assert block.stat_names == stat_names(PERCENTILES)
+    expected = [numpy_stats(values) for values in columns + [np.empty(0)]]
+    np.testing.assert_allclose(block.values, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_export(tmp_path, synthetic_file):
+    slx_filepath, regions, feature_lists = synthetic_file()
+    wide, aggregate = tmp_path / "wide.csv", tmp_path / "aggregate.csv"
+    generate_csv(slx_filepath, str(wide), regions, feature_lists[0], log=lambda message: None)
+    generate_csv(
+        slx_filepath, str(aggregate), regions, feature_lists[0], log=lambda message: None,
+        layout="aggregate", percentiles=PERCENTILES,
+    )
+    wide, aggregate = pd.read_csv(wide), pd.read_csv(aggregate)
+    features = list(wide.columns[4:])
+    names = stat_names(PERCENTILES)
+    assert len(aggregate) == len(regions)
+    for _, row in aggregate.iterrows():
+        spots = wide[wide["tissue_id"] == row["tissue_id"]]
+        assert row["spot_count"] == len(spots)
+        for feature in features:
+            actual = row[[f"{feature} {stat}" for stat in names]].to_numpy(dtype=np.float64)
+            np.testing.assert_allclose(actual, numpy_stats(spots[feature].to_numpy()), rtol=1e-12)
+
+
+@pytest.mark.parametrize("percentiles", [(), (0.0, 100.0)])
+def test_percentile_bounds(percentiles):
+    values = np.array([3.0, np.nan, 1.0, 2.0])
+    block = aggregate_entries(np.zeros(4), values, 1, percentiles)
+    np.testing.assert_allclose(block.values[0], numpy_stats(values, percentiles))
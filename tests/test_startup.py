@@ -0,0 +1,56 @@
+"""
+The GUI starts without the heavy modules, see ``benchmarks.bench_startup``.
+Every check runs in a fresh interpreter, the timings of the benchmark are
+not checked here. Run from the repository root:
+
+    python -m pytest tests
+"""
+import json
+import os
+import subprocess
+import sys
+import pytest
+from benchmarks.bench_startup import HEAVY_MODULES, REPOSITORY, run_startup
+
+pytest.importorskip("PyQt6")
+
+# Modules imported by the GUI before the window is shown
+GUI_MODULES = (
+    "feature_extractor_gui",
+    "controller",
+    "feature_loading_handler",
+    "export_handler",
+    "output",
+    "Worker",
+    "export_writers",
+    "session_manager",
+    "spot_prefetch",
+)
+
+
+def heavy_modules(modules: list[str]) -> list[str]:
+    return sorted({module.split(".")[0] for module in modules} & set(HEAVY_MODULES))
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    # The caches of the window are written to a temporary directory
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+
+
+def test_imports():
+    script = f"import json, sys\nimport {', '.join(GUI_MODULES)}\nprint(json.dumps(sorted(sys.modules)))"
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=REPOSITORY,
+        env=dict(os.environ),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert heavy_modules(json.loads(completed.stdout.strip().splitlines()[-1])) == []
+
+
+def test_window_shown():
+    assert heavy_modules(run_startup()["modules"]) == []